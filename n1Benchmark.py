@@ -0,0 +1,465 @@
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import timeit
+
+import numpy as np
+
+from n1LindenMayer import generate_l_system
+from n1Objeto3D import (LODInstancedMesh, ShaderProgram, _build_sphere, build_instance_data,
+                        create_sphere_lods, cull_instances, model_matrix, perspective, select_lod,
+                        translation_matrix)
+from n1Turtle3D import Turtle3D, draw_tree, draw_tree_vectorized
+
+
+def measure(function, repeats=5):
+    """
+    Tempo mediano (em segundos) de uma chamada de function. Como em
+    timeit, o número de chamadas por amostra é escolhido por
+    Timer.autorange para que cada amostra dure pelo menos 0,2 s; são
+    tomadas 'repeats' amostras e usada a mediana, que é menos sensível a
+    interrupções do sistema que o mínimo de poucas execuções curtas.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    samples = timer.repeat(repeat=repeats, number=number)
+    return statistics.median(samples) / number
+
+
+def benchmark_generation(axiom, rules, max_iterations=8, repeats=5):
+    """
+    Mede a velocidade de geração do L-System (símbolos por segundo)
+    para as iterações de 1 até max_iterations.
+
+    Retorna uma lista de dicionários com iteração, número de símbolos,
+    tempo mediano (em segundos) e símbolos por segundo.
+    """
+    results = []
+
+    for iterations in range(1, max_iterations + 1):
+        symbols = len(generate_l_system(axiom, rules, iterations))
+        seconds = measure(lambda: generate_l_system(axiom, rules, iterations), repeats)
+
+        results.append({
+            'iterations': iterations,
+            'symbols': symbols,
+            'seconds': seconds,
+            'symbols_per_second': symbols / seconds if seconds > 0 else float('inf'),
+        })
+
+    return results
+
+
+def print_generation_results(results):
+    """Imprime a tabela de resultados do benchmark de geração"""
+    print(f"{'iteração':>8} {'símbolos':>12} {'tempo (ms)':>12} {'símbolos/s':>16}")
+    for row in results:
+        print(f"{row['iterations']:>8} {row['symbols']:>12} "
+              f"{row['seconds'] * 1000.0:>12.3f} {row['symbols_per_second']:>16,.0f}")
+
+
+def _legacy_rotate_z(turtle_state, angle_deg):
+    """
+    Rotação como era feita antes da matriz de orientação em cache: uma
+    matriz nova por chamada, três np.dot e três normalizações.
+    """
+    direction, up_vector, right_vector = turtle_state
+    angle_rad = math.radians(angle_deg)
+    rotation_matrix = np.array([
+        [math.cos(angle_rad), -math.sin(angle_rad), 0],
+        [math.sin(angle_rad), math.cos(angle_rad), 0],
+        [0, 0, 1]
+    ])
+    direction = np.dot(rotation_matrix, direction)
+    up_vector = np.dot(rotation_matrix, up_vector)
+    right_vector = np.dot(rotation_matrix, right_vector)
+    direction = direction / np.linalg.norm(direction)
+    up_vector = up_vector / np.linalg.norm(up_vector)
+    right_vector = right_vector / np.linalg.norm(right_vector)
+    return direction, up_vector, right_vector
+
+
+def benchmark_rotations(count=100000, angle=25.0, repeats=5):
+    """
+    Mede rotações por segundo do Turtle3D antes (implementação antiga) e
+    depois (matriz de orientação única com rotações em cache), com o tempo
+    mediano de 'count' rotações.
+    """
+    state = (np.array([1.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0]), np.array([0.0, 0.0, 1.0]))
+
+    def legacy_rotations():
+        current = state
+        for _ in range(count):
+            current = _legacy_rotate_z(current, angle)
+
+    turtle = Turtle3D()
+
+    def cached_rotations():
+        for _ in range(count):
+            turtle.rotate_z(angle)
+
+    legacy = measure(legacy_rotations, repeats)
+    current = measure(cached_rotations, repeats)
+
+    return {
+        'rotations': count,
+        'seconds': current,
+        'legacy_per_second': count / legacy,
+        'cached_per_second': count / current,
+    }
+
+
+def print_rotation_results(result):
+    """Imprime o resultado do benchmark de rotações"""
+    print(f"antes:  {result['legacy_per_second']:>12,.0f} rotações/s")
+    print(f"depois: {result['cached_per_second']:>12,.0f} rotações/s "
+          f"({result['cached_per_second'] / result['legacy_per_second']:.1f}x)")
+
+
+def benchmark_draw_tree(depths=range(4, 10), repeats=5):
+    """
+    Mede segmentos por segundo do Turtle3D ao desenhar a árvore de
+    draw_tree (recursiva) e de draw_tree_vectorized, nas profundidades dadas.
+    Cada chamada medida inclui a criação de uma tartaruga nova.
+    """
+    results = []
+
+    for depth in depths:
+        row = {'depth': depth}
+        for name, function in (('recursive', draw_tree), ('vectorized', draw_tree_vectorized)):
+            turtle = Turtle3D()
+            function(turtle, 1.0, depth)
+            row['segments'] = len(turtle.segments)
+            seconds = measure(lambda: function(Turtle3D(), 1.0, depth), repeats)
+            row[name + '_seconds'] = seconds
+            row[name + '_per_second'] = row['segments'] / seconds if seconds > 0 else float('inf')
+        results.append(row)
+
+    return results
+
+
+def print_draw_tree_results(results):
+    """Imprime a tabela de resultados do benchmark de draw_tree"""
+    print(f"{'profundidade':>12} {'segmentos':>10} {'recursivo (seg/s)':>18} {'vetorizado (seg/s)':>19}")
+    for row in results:
+        print(f"{row['depth']:>12} {row['segments']:>10} "
+              f"{row['recursive_per_second']:>18,.0f} {row['vectorized_per_second']:>19,.0f}")
+
+
+def benchmark_sphere(tessellations=(8, 16, 32, 64, 128, 256), repeats=5):
+    """
+    Mede o tempo mediano de construção da malha da esfera (sem o cache de
+    create_sphere) com o mesmo número de fatias e pilhas.
+    """
+    results = []
+
+    for size in tessellations:
+        vertices, normals, indices = _build_sphere(1.0, size, size)
+        results.append({
+            'tessellation': size,
+            'vertices': len(vertices) // 3,
+            'triangles': len(indices) // 3,
+            'seconds': measure(lambda: _build_sphere(1.0, size, size), repeats),
+        })
+
+    return results
+
+
+def print_sphere_results(results):
+    """Imprime a tabela de resultados do benchmark de create_sphere"""
+    print(f"{'fatias':>8} {'vértices':>10} {'triângulos':>11} {'tempo (ms)':>12}")
+    for row in results:
+        print(f"{row['tessellation']:>8} {row['vertices']:>10} {row['triangles']:>11} "
+              f"{row['seconds'] * 1000.0:>12.3f}")
+
+
+class _NullGL:
+    """
+    Camada de OpenGL sem efeito: as chamadas retornam na hora, então o
+    benchmark de quadro mede só o custo de CPU do lado Python.
+    """
+    GL_ACTIVE_UNIFORMS = GL_TRUE = GL_ARRAY_BUFFER = GL_ELEMENT_ARRAY_BUFFER = 0
+    GL_STATIC_DRAW = GL_DYNAMIC_DRAW = GL_FLOAT = GL_FALSE = GL_TRIANGLES = GL_UNSIGNED_INT = 0
+
+    def glGetProgramiv(self, *args):
+        return 0
+
+    def glGenVertexArrays(self, count):
+        return 1
+
+    def glGenBuffers(self, count):
+        return 1 if count == 1 else list(range(1, count + 1))
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+def benchmark_frame_setup(frames=2000, instances=1000, seed=0, repeats=5):
+    """
+    Mede o custo de CPU por quadro da preparação feita no loop de
+    n1Objeto3D.main: matriz do modelo e uniforms da esfera única e, no modo
+    instanciado, frustum culling, seleção de LOD e envio das instâncias.
+    Cada chamada medida anima 'frames' quadros (um décimo no modo
+    instanciado). As chamadas de GL vão para uma camada vazia (_NullGL).
+    """
+    gl = _NullGL()
+    projection = perspective(45.0, 800 / 600, 0.1, 100.0)
+    view = np.identity(4, dtype=np.float32)
+    model = np.identity(4, dtype=np.float32)
+
+    # Esfera única: model_matrix e uniforms
+    program = ShaderProgram(1, gl)
+
+    def single_frames():
+        for frame in range(frames):
+            model_matrix(math.radians(0.5 * frame), math.radians(0.3 * frame), out=model)
+            program.set_matrix4("model", model)
+            program.set_matrix4("view", view)
+            program.set_matrix4("projection", projection)
+            program.set_vec3("lightPos", 3.0, 3.0, 5.0)
+            program.set_vec3("viewPos", 0.0, 0.0, 5.0)
+            program.set_vec3("lightColor", 1.0, 1.0, 1.0)
+            program.set_vec3("objectColor", 0.5, 0.7, 0.9)
+            program.set_int("renderMode", 0)
+
+    single = measure(single_frames, repeats) / frames
+
+    # Modo instanciado: culling, LOD e envio das instâncias visíveis
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-1.0, 1.0, (instances, 3))
+    scales = np.full(instances, 0.5 / instances ** (1.0 / 3.0))
+    instance_data = build_instance_data(centers, scales)
+    mesh = LODInstancedMesh(create_sphere_lods(1.0), gl)
+    camera = translation_matrix(0.0, 0.0, -4.0)
+    instanced_view = np.identity(4, dtype=np.float32)
+    view_projection = np.identity(4, dtype=np.float32)
+    instanced_frames = max(frames // 10, 1)
+
+    def instanced_frames_setup():
+        for frame in range(instanced_frames):
+            model_matrix(math.radians(0.5 * frame), math.radians(0.3 * frame), out=model)
+            np.dot(camera, model, out=instanced_view)
+            np.dot(projection, instanced_view, out=view_projection)
+            visible = cull_instances(centers, scales, view_projection)
+            levels = select_lod(centers[visible], scales[visible], instanced_view, projection, 600)
+            mesh.update_levels(instance_data[visible], levels)
+
+    instanced = measure(instanced_frames_setup, repeats) / instanced_frames
+
+    return {
+        'frames': frames,
+        'single_seconds': single,
+        'single_run_seconds': single * frames,
+        'instances': instances,
+        'instanced_seconds': instanced,
+        'instanced_run_seconds': instanced * instanced_frames,
+        'uniform_uploads': program.uploads,
+        'uniform_skipped': program.skipped,
+    }
+
+
+def print_frame_results(result):
+    """Imprime o custo de CPU por quadro"""
+    print(f"esfera única:  {result['single_seconds'] * 1e6:>10.1f} us/quadro "
+          f"({result['uniform_uploads']} envios de uniform, {result['uniform_skipped']} ignorados)")
+    print(f"instanciado:   {result['instanced_seconds'] * 1e6:>10.1f} us/quadro "
+          f"({result['instances']} instâncias)")
+
+
+def run_suite(quick=False, only=None):
+    """
+    Executa os benchmarks e retorna os resultados brutos de cada um e as
+    métricas usadas na comparação com a linha de base. Cada métrica tem o
+    valor e se maior é melhor (taxas) ou pior (tempos).
+    """
+    # Mesmo L-System usado em n1LindenMayer.main
+    axiom = "F"
+    rules = {"F": "F[+F]F[-F]F"}
+
+    suite = {
+        'generation': (lambda: benchmark_generation(axiom, rules, max_iterations=6 if quick else 8),
+                       print_generation_results, "Geração do L-System"),
+        'rotations': (lambda: benchmark_rotations(10000 if quick else 100000),
+                      print_rotation_results, "Rotações do Turtle3D"),
+        'draw_tree': (lambda: benchmark_draw_tree(range(4, 8) if quick else range(4, 10)),
+                      print_draw_tree_results, "draw_tree do Turtle3D"),
+        'sphere': (lambda: benchmark_sphere((8, 16, 32, 64) if quick else (8, 16, 32, 64, 128, 256)),
+                   print_sphere_results, "Construção da esfera"),
+        'frame': (lambda: benchmark_frame_setup(200 if quick else 2000),
+                  print_frame_results, "Custo de CPU por quadro (n1Objeto3D)"),
+    }
+
+    results = {}
+    for name, (function, printer, title) in suite.items():
+        if only and name not in only:
+            continue
+        print(f"=== {title} ===")
+        results[name] = function()
+        printer(results[name])
+        print()
+
+    report = environment(quick)
+    report['results'] = results
+    report['metrics'] = collect_metrics(results)
+    return report
+
+
+def environment(quick):
+    """Versões e máquina em que os benchmarks rodam, gravadas no relatório"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'quick': quick,
+    }
+
+
+def collect_metrics(results):
+    """Extrai as métricas comparáveis (nome -> valor e direção) dos resultados"""
+    metrics = {}
+
+    def add(name, value, higher_is_better, seconds):
+        # seconds: duração de uma chamada medida, usada para identificar métricas ruidosas
+        metrics[name] = {'value': value, 'higher_is_better': higher_is_better, 'seconds': seconds}
+
+    for row in results.get('generation', []):
+        add(f"generation/iterations={row['iterations']}/symbols_per_second", row['symbols_per_second'], True,
+            row['seconds'])
+    if 'rotations' in results:
+        add("rotations/per_second", results['rotations']['cached_per_second'], True, results['rotations']['seconds'])
+    for row in results.get('draw_tree', []):
+        for name in ('recursive', 'vectorized'):
+            add(f"draw_tree/depth={row['depth']}/{name}_per_second", row[name + '_per_second'], True,
+                row[name + '_seconds'])
+    for row in results.get('sphere', []):
+        add(f"sphere/tessellation={row['tessellation']}/seconds", row['seconds'], False, row['seconds'])
+    if 'frame' in results:
+        frame = results['frame']
+        add("frame/single_seconds", frame['single_seconds'], False, frame['single_run_seconds'])
+        add("frame/instanced_seconds", frame['instanced_seconds'], False, frame['instanced_run_seconds'])
+
+    return metrics
+
+
+# Campos do relatório que precisam ser iguais para que a comparação faça sentido
+COMPARABLE_FIELDS = ('quick', 'python', 'numpy', 'machine')
+
+
+def incompatible_fields(report, baseline):
+    """Campos de ambiente em que o relatório e a linha de base diferem"""
+    return [(field, baseline.get(field), report[field])
+            for field in COMPARABLE_FIELDS if baseline.get(field) != report[field]]
+
+
+def compare(metrics, baseline, threshold=0.10, min_seconds=1e-3):
+    """
+    Compara as métricas com as da linha de base. Uma métrica regride quando
+    piora mais que threshold (fração) em relação à base. Métricas cuja
+    chamada medida dura menos que min_seconds (na base ou agora) são
+    dominadas por ruído: aparecem na comparação, mas não contam como
+    regressão. Retorna a lista de comparações (nome, base, atual, variação
+    relativa, se entra na decisão, regrediu).
+    """
+    comparisons = []
+    for name, metric in metrics.items():
+        reference = baseline.get(name)
+        if reference is None or not reference['value']:
+            continue
+        change = metric['value'] / reference['value'] - 1.0
+        # Variação positiva significa melhora
+        improvement = change if metric['higher_is_better'] else -change
+        gated = min(metric['seconds'], reference.get('seconds', metric['seconds'])) >= min_seconds
+        comparisons.append({
+            'name': name,
+            'baseline': reference['value'],
+            'current': metric['value'],
+            'improvement': improvement,
+            'gated': gated,
+            'regression': gated and improvement < -threshold,
+        })
+    return comparisons
+
+
+def confirm_regressions(comparisons, baseline, threshold, quick):
+    """
+    Mede de novo os benchmarks com métricas que regrediram e mantém como
+    regressão só as que pioram também na segunda medida, para que uma
+    interrupção do sistema durante a primeira não falhe a verificação.
+    """
+    suspects = {row['name'] for row in comparisons if row['regression']}
+    if not suspects:
+        return comparisons
+    print("=== Medindo de novo os benchmarks com regressão ===")
+    report = run_suite(quick=quick, only={name.split('/')[0] for name in suspects})
+    again = {row['name']: row for row in compare(report['metrics'], baseline, threshold)}
+    for row in comparisons:
+        if row['regression']:
+            second = again.get(row['name'])
+            row['remeasured'] = second['improvement'] if second else None
+            row['regression'] = bool(second and second['regression'])
+    return comparisons
+
+
+def print_comparison(comparisons, threshold):
+    """Imprime a comparação com a linha de base"""
+    print(f"=== Comparação com a linha de base (limite {threshold:.0%}) ===")
+    for row in comparisons:
+        flag = "REGRESSÃO" if row['regression'] else "" if row['gated'] else "(< 1 ms, só informativa)"
+        if row.get('remeasured') is not None:
+            flag = f"{flag} (nova medida {row['remeasured']:+.1%})".strip()
+        print(f"{row['name']:<52} {row['improvement']:>+8.1%} {flag}")
+    regressions = sum(row['regression'] for row in comparisons)
+    gated = sum(row['gated'] for row in comparisons)
+    print(f"{regressions} regressões em {gated} métricas verificadas ({len(comparisons)} comparadas)")
+
+
+def parse_args(argv=None):
+    """Lê as opções do executor de benchmarks"""
+    parser = argparse.ArgumentParser(description="Executa os benchmarks headless do projeto.")
+    parser.add_argument('--only', nargs='+', choices=['generation', 'rotations', 'draw_tree', 'sphere', 'frame'],
+                        help="Executa só os benchmarks indicados")
+    parser.add_argument('--quick', action='store_true', help="Tamanhos menores, para uma verificação rápida")
+    parser.add_argument('--output', help="Salva os resultados neste arquivo JSON")
+    parser.add_argument('--baseline', help="Arquivo JSON de uma execução anterior para comparação")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Piora relativa a partir da qual uma métrica é regressão (padrão: 0.10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        # Confere antes de rodar: quick, Python, NumPy e máquina precisam ser os mesmos
+        differences = incompatible_fields(environment(args.quick), baseline)
+        if differences:
+            for field, expected, actual in differences:
+                print(f"{field}: linha de base {expected!r}, atual {actual!r}", file=sys.stderr)
+            sys.exit(f"A linha de base {args.baseline} não é comparável com esta execução")
+
+    report = run_suite(quick=args.quick, only=args.only)
+
+    regression = False
+    if baseline is not None:
+        comparisons = compare(report['metrics'], baseline['metrics'], args.threshold)
+        comparisons = confirm_regressions(comparisons, baseline['metrics'], args.threshold, args.quick)
+        report['comparison'] = comparisons
+        print_comparison(comparisons, args.threshold)
+        regression = any(row['regression'] for row in comparisons)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    # Código de saída diferente de zero para uso em integração contínua
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import numpy as np
+
+
+def grow_buffer(buffer, used, required):
+    """
+    Buffer com capacidade para pelo menos 'required' linhas: o próprio, se
+    couber, ou um novo com a capacidade dobrada até caber, com as 'used'
+    primeiras linhas copiadas.
+    """
+    capacity = len(buffer)
+    if required <= capacity:
+        return buffer
+    capacity = max(capacity, 1)
+    while capacity < required:
+        capacity *= 2
+    grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:used] = buffer[:used]
+    return grown
+
+
+def frustum_planes(view_projection):
+    """
+    Extrai os seis planos do frustum (a, b, c, d), normalizados, da matriz
+    view-projection (convenção de linhas usada por perspective).
+    """
+    m = np.asarray(view_projection, dtype=np.float64)
+    planes = np.array([
+        m[3] + m[0], m[3] - m[0],  # esquerda, direita
+        m[3] + m[1], m[3] - m[1],  # baixo, cima
+        m[3] + m[2], m[3] - m[2],  # perto, longe
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+def look_at(eye, target, up):
+    """Matriz de visão 4x4 equivalente a gluLookAt (convenção de linhas)"""
+    eye = np.asarray(eye, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    upward = np.cross(side, forward)
+    view = np.identity(4)
+    view[0, :3], view[1, :3], view[2, :3] = side, upward, -forward
+    view[:3, 3] = -view[:3, :3] @ eye
+    return view
+
+
+def ray_from_screen(x, y, view_projection, width, height):
+    """
+    Raio (origem, direção unitária) que passa pelo pixel (x, y) de uma
+    janela width x height (viewport inteiro), com y contado a partir do
+    topo, como nos eventos de mouse do GLUT.
+    """
+    ndc_x = 2.0 * (x + 0.5) / width - 1.0
+    ndc_y = 1.0 - 2.0 * (y + 0.5) / height
+    inverse = np.linalg.inv(np.asarray(view_projection, dtype=np.float64))
+    near = inverse @ np.array([ndc_x, ndc_y, -1.0, 1.0])
+    far = inverse @ np.array([ndc_x, ndc_y, 1.0, 1.0])
+    origin = near[:3] / near[3]
+    direction = far[:3] / far[3] - origin
+    return origin, direction / np.linalg.norm(direction)
+
+
+def _morton_codes(points, bits=10):
+    """Códigos de Morton (Z-order) de pontos 3D, com 'bits' bits por eixo"""
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    cells = ((points - lo) / extent * ((1 << bits) - 1)).astype(np.uint64)
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return codes
+
+
+class SegmentIndex:
+    """
+    Hierarquia de volumes envolventes (BVH) sobre segmentos 3D, construída
+    em lote com NumPy: os segmentos são ordenados pelo código de Morton do
+    centro, agrupados em folhas de leaf_size segmentos e os níveis acima são
+    obtidos juntando as caixas dos pares de nós (árvore binária implícita).
+    As consultas percorrem a árvore nível a nível, com a fronteira de nós
+    como array.
+
+    Segmentos inseridos depois da construção ficam numa lista pendente,
+    testada por força bruta, até a próxima reconstrução (automática quando
+    a lista passa de rebuild_ratio do total indexado). Os segmentos ficam
+    num buffer de grow_buffer, então inserir um por vez custa O(1)
+    amortizado.
+
+    Args:
+        segments: Array (N, 2, 3) (ou (N, 2, 2), com z = 0) de segmentos
+        leaf_size: Segmentos por folha
+        rebuild_ratio: Fração de segmentos pendentes que dispara a reconstrução
+    """
+    def __init__(self, segments=None, leaf_size=8, rebuild_ratio=0.25):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.revision = None
+        self.rebuilds = 0
+        self.build(np.empty((0, 2, 3)) if segments is None else segments)
+
+    @staticmethod
+    def _as_segments(segments):
+        segments = np.asarray(segments, dtype=np.float64)
+        if segments.ndim == 3 and segments.shape[2] == 2:
+            segments = np.concatenate([segments, np.zeros(segments.shape[:2] + (1,))], axis=2)
+        return segments.reshape(-1, 2, 3)
+
+    @property
+    def segments(self):
+        """Segmentos indexados e pendentes, como array (N, 2, 3) float64, sem cópia"""
+        return self._buffer[:self._count]
+
+    def build(self, segments):
+        """Reconstrói o índice com todos os segmentos"""
+        self._buffer = self._as_segments(segments)
+        self._count = len(self._buffer)
+        return self._index()
+
+    def _index(self):
+        """Constrói a BVH sobre todos os segmentos do buffer"""
+        self.indexed = self._count
+        self.rebuilds += 1
+        self.levels = []
+        self.order = np.zeros(0, dtype=np.int64)
+        if self.indexed == 0:
+            return self
+
+        lo = self.segments.min(axis=1)
+        hi = self.segments.max(axis=1)
+        order = np.argsort(_morton_codes((lo + hi) * 0.5), kind='stable')
+
+        # Folhas em número potência de dois; as posições vazias têm id -1
+        leaves = 1 << int(np.ceil(np.log2(-(-self.indexed // self.leaf_size))))
+        self.order = np.full(leaves * self.leaf_size, -1, dtype=np.int64)
+        self.order[:self.indexed] = order
+        slot_lo = np.full((len(self.order), 3), np.inf)
+        slot_hi = np.full((len(self.order), 3), -np.inf)
+        slot_lo[:self.indexed] = lo[order]
+        slot_hi[:self.indexed] = hi[order]
+
+        node_lo = slot_lo.reshape(leaves, self.leaf_size, 3).min(axis=1)
+        node_hi = slot_hi.reshape(leaves, self.leaf_size, 3).max(axis=1)
+        node_count = (self.order.reshape(leaves, self.leaf_size) >= 0).sum(axis=1)
+        self.levels = [(node_lo, node_hi, node_count)]
+        while len(node_lo) > 1:
+            node_lo = np.minimum(node_lo[0::2], node_lo[1::2])
+            node_hi = np.maximum(node_hi[0::2], node_hi[1::2])
+            node_count = node_count[0::2] + node_count[1::2]
+            self.levels.append((node_lo, node_hi, node_count))
+        # Da raiz para as folhas
+        self.levels.reverse()
+        return self
+
+    def insert(self, segments):
+        """Acrescenta segmentos (ficam pendentes até a próxima reconstrução)"""
+        segments = self._as_segments(segments)
+        if len(segments) == 0:
+            return self
+        self._buffer = grow_buffer(self._buffer, self._count, self._count + len(segments))
+        self._buffer[self._count:self._count + len(segments)] = segments
+        self._count += len(segments)
+        if self._count - self.indexed > max(self.rebuild_ratio * self.indexed, 4 * self.leaf_size):
+            self._index()
+        return self
+
+    def sync(self, segments, revision=0):
+        """
+        Atualiza o índice com os segmentos da tartaruga, como
+        SegmentRenderer.sync: se a revisão mudou ou o número de segmentos
+        diminuiu, reconstrói; caso contrário, insere só os segmentos novos.
+        """
+        if revision != self.revision or len(segments) < len(self.segments):
+            self.build(segments)
+        elif len(segments) > len(self.segments):
+            self.insert(segments[len(self.segments):])
+        self.revision = revision
+        return self
+
+    def __len__(self):
+        return len(self.segments)
+
+    def _candidates(self, node_test, prune=None):
+        """
+        Percorre a árvore mantendo os nós aprovados por node_test(lo, hi,
+        count) e retorna os ids dos segmentos das folhas alcançadas, mais os
+        pendentes. prune(lo, hi, count), se informado, recebe a máscara já
+        aprovada e pode restringi-la usando todo o nível.
+        """
+        frontier = np.zeros(1, dtype=np.int64) if self.levels else np.zeros(0, dtype=np.int64)
+        for depth, (lo, hi, count) in enumerate(self.levels):
+            if depth > 0:
+                frontier = np.stack([2 * frontier, 2 * frontier + 1], axis=1).ravel()
+            keep = node_test(lo[frontier], hi[frontier], count[frontier]) & (count[frontier] > 0)
+            if prune is not None:
+                keep = prune(lo[frontier], hi[frontier], count[frontier], keep)
+            frontier = frontier[keep]
+
+        ids = self.order[(frontier[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()]
+        return np.concatenate([ids[ids >= 0], np.arange(self.indexed, len(self.segments))])
+
+    def visible(self, view_projection):
+        """
+        Ids (em ordem) dos segmentos que têm algum trecho dentro do frustum
+        da matriz view-projection.
+        """
+        planes = frustum_planes(view_projection)
+        normals, offsets = planes[:, :3], planes[:, 3]
+
+        def node_test(lo, hi, count):
+            # Caixa fora se o vértice mais à frente de algum plano está atrás dele
+            farthest = np.where(normals[None, :, :] >= 0, hi[:, None, :], lo[:, None, :])
+            return np.all(np.einsum('npk,pk->np', farthest, normals) + offsets >= 0, axis=1)
+
+        ids = self._candidates(node_test)
+        a, b = self.segments[ids, 0], self.segments[ids, 1]
+
+        # Recorte exato de cada segmento pelos seis planos (intervalo [t0, t1])
+        da = a @ normals.T + offsets
+        db = b @ normals.T + offsets
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = da / (da - db)
+        t0 = np.max(np.where((da < 0) & (db >= 0), t, 0.0), axis=1)
+        t1 = np.min(np.where((db < 0) & (da >= 0), t, 1.0), axis=1)
+        inside = ~np.any((da < 0) & (db < 0), axis=1) & (t0 <= t1)
+        return np.sort(ids[inside])
+
+    def raycast(self, origin, direction, radius):
+        """
+        Seleção por raio: o segmento a até 'radius' do raio que fica mais
+        perto da origem ao longo dele. Retorna (id, t, distância) ou None.
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+        safe = np.where(np.abs(direction) < 1e-30, 1e-30, direction)
+        inverse = 1.0 / safe
+
+        def node_test(lo, hi, count):
+            # Teste de placas contra a caixa expandida pelo raio de seleção
+            t_lo = (lo - radius - origin) * inverse
+            t_hi = (hi + radius - origin) * inverse
+            near = np.minimum(t_lo, t_hi).max(axis=1)
+            far = np.maximum(t_lo, t_hi).min(axis=1)
+            return (far >= np.maximum(near, 0.0))
+
+        ids = self._candidates(node_test)
+        if len(ids) == 0:
+            return None
+
+        # Pontos mais próximos entre o raio (t >= 0) e cada segmento (s em [0, 1])
+        a = self.segments[ids, 0]
+        edge = self.segments[ids, 1] - a
+        w = origin - a
+        b = edge @ direction
+        c = np.einsum('ij,ij->i', edge, edge)
+        d = w @ direction
+        e = np.einsum('ij,ij->i', edge, w)
+        denominator = c - b * b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.clip(np.where(denominator > 1e-12, (e - b * d) / denominator, 0.0), 0.0, 1.0)
+            t = np.maximum(b * s - d, 0.0)
+            s = np.clip(np.where(c > 1e-12, (t * b + e) / c, 0.0), 0.0, 1.0)
+        gap = origin + t[:, None] * direction - (a + s[:, None] * edge)
+        distance = np.linalg.norm(gap, axis=1)
+
+        hits = np.flatnonzero(distance <= radius)
+        if len(hits) == 0:
+            return None
+        best = hits[np.lexsort((ids[hits], t[hits]))[0]]
+        return int(ids[best]), float(t[best]), float(distance[best])
+
+    def nearest(self, point, k=1):
+        """
+        Os k segmentos mais próximos do ponto: ids e distâncias, em ordem
+        crescente de distância.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        if len(point) == 2:
+            point = np.append(point, 0.0)
+        k = min(k, len(self.segments))
+
+        def box_distances(lo, hi):
+            closest = np.clip(point, lo, hi)
+            farthest = np.where(np.abs(point - lo) > np.abs(point - hi), lo, hi)
+            return np.linalg.norm(closest - point, axis=1), np.linalg.norm(farthest - point, axis=1)
+
+        def prune(lo, hi, count, keep):
+            # Todo segmento de um nó está a no máximo a distância do canto mais
+            # longe: com k segmentos garantidos até 'bound', nós mais longe saem
+            low, high = box_distances(lo, hi)
+            pending = len(self.segments) - self.indexed
+            if pending >= k:
+                return keep
+            order = np.argsort(high[keep])
+            covered = np.cumsum(count[keep][order])
+            reach = np.searchsorted(covered, k - pending)
+            if reach >= len(order):
+                return keep
+            bound = high[keep][order[reach]]
+            return keep & (low <= bound)
+
+        ids = self._candidates(lambda lo, hi, count: np.ones(len(lo), dtype=bool), prune)
+        if k <= 0 or len(ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        a = self.segments[ids, 0]
+        edge = self.segments[ids, 1] - a
+        c = np.einsum('ij,ij->i', edge, edge)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.clip(np.where(c > 1e-12, np.einsum('ij,ij->i', point - a, edge) / c, 0.0), 0.0, 1.0)
+        distance = np.linalg.norm(a + s[:, None] * edge - point, axis=1)
+
+        best = np.lexsort((ids, distance))[:k]
+        return ids[best], distance[best]
@@ -0,0 +1,170 @@
+import json
+import struct
+
+import numpy as np
+
+# Formato binário de geometria (.n1g)
+#
+#   cabeçalho (32 bytes): magic, versão, tipo, número de arrays, tamanho dos metadados
+#   tabela: uma entrada de 64 bytes por array (nome, dtype, dimensões, forma, deslocamento)
+#   metadados: JSON em UTF-8 (parâmetros do L-System, da esfera etc.)
+#   dados: cada array em bytes crus (little-endian), começando em múltiplo de ALIGNMENT
+#
+# Como os dados ficam alinhados e sem compressão, a leitura é feita com
+# np.memmap: abrir um arquivo de vários gigabytes é imediato e só as
+# páginas efetivamente lidas (enviadas à GPU ou inspecionadas) vêm do disco.
+
+MAGIC = b"N1GEOM\0\0"
+VERSION = 1
+ALIGNMENT = 4096
+
+KIND_SEGMENTS_2D = 1
+KIND_SEGMENTS_3D = 2
+KIND_MESH = 3
+
+_HEADER = struct.Struct('<8sIIIIQ')
+_ENTRY = struct.Struct('<16sII4IQQ')
+_DTYPES = {0: np.dtype('<f4'), 1: np.dtype('<u4')}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+class Geometry:
+    """
+    Geometria carregada de um arquivo .n1g: tipo, metadados e os arrays
+    (np.memmap, sem cópia) indexados pelo nome.
+    """
+
+    def __init__(self, kind, arrays, metadata):
+        self.kind = kind
+        self.arrays = arrays
+        self.metadata = metadata
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_geometry(path, kind, arrays, metadata=None):
+    """
+    Grava os arrays (dicionário nome -> array float32 ou uint32, até 4
+    dimensões) no formato .n1g, com os metadados em JSON.
+    """
+    arrays = {name: np.asarray(array) for name, array in arrays.items()}
+    meta = json.dumps(metadata or {}).encode('utf-8')
+
+    entries = []
+    offset = _aligned(_HEADER.size + _ENTRY.size * len(arrays) + len(meta))
+    for name, array in arrays.items():
+        dtype = array.dtype.newbyteorder('<')
+        if dtype not in _DTYPE_CODES:
+            raise ValueError(f"Tipo não suportado para {name!r}: {array.dtype} (use float32 ou uint32)")
+        if array.ndim > 4 or len(name.encode('ascii')) > 16:
+            raise ValueError(f"Array {name!r} com nome ou dimensões inválidas")
+        shape = list(array.shape) + [0] * (4 - array.ndim)
+        entries.append(_ENTRY.pack(name.encode('ascii'), _DTYPE_CODES[dtype], array.ndim,
+                                   *shape, offset, array.nbytes))
+        offset = _aligned(offset + array.nbytes)
+
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, kind, len(arrays), len(meta), 0))
+        file.writelines(entries)
+        file.write(meta)
+        for array in arrays.values():
+            file.seek(_aligned(file.tell()))
+            # Escrita direta do buffer, sem cópia (exceto se não for contíguo)
+            file.write(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).data)
+        file.truncate(_aligned(file.tell()))
+
+
+def read_header(path):
+    """Lê o cabeçalho, a tabela de arrays e os metadados de um arquivo .n1g"""
+    with open(path, 'rb') as file:
+        magic, version, kind, count, meta_size, _ = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Arquivo de geometria inválido: {path}")
+        if version != VERSION:
+            raise ValueError(f"Versão de geometria não suportada: {version}")
+
+        entries = []
+        for _ in range(count):
+            name, dtype, ndim, *rest = _ENTRY.unpack(file.read(_ENTRY.size))
+            shape, offset = tuple(rest[:ndim]), rest[4]
+            entries.append((name.rstrip(b'\0').decode('ascii'), _DTYPES[dtype], shape, offset))
+        metadata = json.loads(file.read(meta_size).decode('utf-8'))
+
+    return kind, entries, metadata
+
+
+def load_geometry(path, mode='r'):
+    """
+    Abre um arquivo .n1g sem copiar os dados: cada array é um np.memmap.
+    Com mode='c' (cópia na escrita) os arrays podem ser alterados na
+    memória sem modificar o arquivo.
+    """
+    kind, entries, metadata = read_header(path)
+    arrays = {}
+    for name, dtype, shape, offset in entries:
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+    return Geometry(kind, arrays, metadata)
+
+
+def write_segments(path, segments, metadata=None):
+    """
+    Grava segmentos (N, 2, 2) de interpret_l_system ou (N, 2, 3) do
+    Turtle3D como float32.
+    """
+    segments = np.asarray(segments, dtype=np.float32)
+    if segments.ndim != 3 or segments.shape[1] != 2 or segments.shape[2] not in (2, 3):
+        raise ValueError(f"Segmentos devem ter forma (N, 2, 2) ou (N, 2, 3), não {segments.shape}")
+    kind = KIND_SEGMENTS_2D if segments.shape[2] == 2 else KIND_SEGMENTS_3D
+    write_geometry(path, kind, {'segments': segments}, metadata)
+
+
+def write_turtle(path, turtle, metadata=None):
+    """Grava as linhas desenhadas por um Turtle3D"""
+    write_segments(path, turtle.segments, metadata)
+
+
+def load_segments(path, mode='r'):
+    """Abre os segmentos de um arquivo .n1g (np.memmap (N, 2, 2) ou (N, 2, 3))"""
+    geometry = load_geometry(path, mode)
+    if geometry.kind not in (KIND_SEGMENTS_2D, KIND_SEGMENTS_3D):
+        raise ValueError(f"{path} não contém segmentos")
+    return geometry['segments']
+
+
+def load_turtle(path, turtle):
+    """
+    Carrega as linhas de um arquivo .n1g em um Turtle3D, sem cópia: o
+    buffer da tartaruga passa a ser o mapeamento do arquivo (em cópia na
+    escrita), então só os trechos enviados ao VBO são lidos do disco.
+    """
+    segments = load_segments(path, mode='c')
+    if segments.shape[2] != 3:
+        raise ValueError(f"{path} contém segmentos 2D, não do Turtle3D")
+    turtle.adopt_segments(segments)
+    return turtle
+
+
+def write_mesh(path, vertices, normals, indices, metadata=None):
+    """Grava uma malha de create_sphere (vértices e normais float32, índices uint32)"""
+    write_geometry(path, KIND_MESH, {
+        'vertices': np.asarray(vertices, dtype=np.float32).reshape(-1, 3),
+        'normals': np.asarray(normals, dtype=np.float32).reshape(-1, 3),
+        'indices': np.asarray(indices, dtype=np.uint32).reshape(-1, 3),
+    }, metadata)
+
+
+def load_mesh(path, mode='r'):
+    """Abre uma malha .n1g e retorna vértices, normais e índices planos, como create_sphere"""
+    geometry = load_geometry(path, mode)
+    if geometry.kind != KIND_MESH:
+        raise ValueError(f"{path} não contém uma malha")
+    return (geometry['vertices'].reshape(-1), geometry['normals'].reshape(-1),
+            geometry['indices'].reshape(-1))
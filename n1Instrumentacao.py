@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+
+class RollingStats:
+    """
+    Janela deslizante com as últimas amostras de uma medida (por exemplo, o
+    tempo de cada quadro), para calcular percentis recentes.
+    """
+
+    def __init__(self, window=600):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        """Percentis das amostras da janela (vazio se não houver amostras)"""
+        if not self.samples:
+            return {}
+        values = np.percentile(np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)), quantiles)
+        return {f"p{q}": float(v) for q, v in zip(quantiles, values)}
+
+    def summary(self):
+        result = {'count': self.count, 'mean': self.total / self.count if self.count else 0.0}
+        result.update(self.percentiles())
+        return result
+
+
+class _NullTimer:
+    """Temporizador que não faz nada, usado quando a instrumentação está desligada"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Temporizador de escopo: soma a duração do bloco with na medida de mesmo nome"""
+
+    __slots__ = ('instruments', 'name', 'start')
+
+    def __init__(self, instruments, name):
+        self.instruments = instruments
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    """
+    Temporizadores de escopo, contadores e estatísticas por quadro,
+    compartilhados entre os visualizadores.
+
+    Uso:
+        with instruments.timer('draw'):
+            ...
+        instruments.count('segments', n)
+        instruments.end_frame()
+
+    Cada end_frame fecha um quadro: as durações acumuladas no quadro entram
+    nas janelas de percentis (p50/p95/p99) e, se houver um arquivo JSON
+    lines aberto, o quadro é escrito como uma linha. Desligada (o padrão),
+    timer devolve um objeto vazio compartilhado e count / record / end_frame
+    retornam logo no início, então pode ficar no código de produção.
+
+    Args:
+        enabled: Liga a coleta
+        window: Número de quadros considerados nos percentis
+    """
+
+    def __init__(self, enabled=False, window=600):
+        self.enabled = enabled
+        self.window = window
+        self.frames = 0
+        self.stats = {}
+        self.totals = {}
+        self._frame_times = {}
+        self._frame_counts = {}
+        self._frame_start = None
+        self._sink = None
+
+    def enable(self, jsonl_path=None):
+        """Liga a coleta e, se jsonl_path for informado, a exportação em JSON lines"""
+        self.enabled = True
+        if jsonl_path:
+            self.close()
+            self._sink = open(jsonl_path, 'a', buffering=1, encoding='utf-8')
+
+    def disable(self):
+        self.enabled = False
+        self.close()
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def timer(self, name):
+        """Context manager que mede a duração do bloco"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        """Soma uma duração (em segundos) à medida do quadro atual"""
+        if not self.enabled:
+            return
+        self._frame_times[name] = self._frame_times.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        """Soma value ao contador (no quadro atual e no total)"""
+        if not self.enabled:
+            return
+        self._frame_counts[name] = self._frame_counts.get(name, 0) + value
+        self.totals[name] = self.totals.get(name, 0) + value
+
+    def end_frame(self):
+        """
+        Fecha o quadro: o tempo desde o end_frame anterior vira a medida
+        'frame', as medidas do quadro entram nas estatísticas e a linha JSON
+        é exportada.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self._frame_times['frame'] = now - self._frame_start
+        self._frame_start = now
+
+        for name, seconds in self._frame_times.items():
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = RollingStats(self.window)
+            stats.add(seconds)
+
+        if self._sink is not None:
+            line = {
+                'frame': self.frames,
+                'time': time.time(),
+                'ms': {name: seconds * 1000.0 for name, seconds in self._frame_times.items()},
+                'counts': self._frame_counts,
+            }
+            self._sink.write(json.dumps(line) + "\n")
+
+        self.frames += 1
+        self._frame_times = {}
+        self._frame_counts = {}
+
+    def summary(self):
+        """Estatísticas (em milissegundos) de cada medida e os totais dos contadores"""
+        timers = {}
+        for name, stats in self.stats.items():
+            timers[name] = {key: value * 1000.0 if key != 'count' else value
+                            for key, value in stats.summary().items()}
+        return {'frames': self.frames, 'ms': timers, 'counts': dict(self.totals)}
+
+    def format_line(self, name='frame'):
+        """Texto curto com os percentis de uma medida, para títulos ou texto na tela"""
+        stats = self.stats.get(name)
+        if stats is None or not stats.count:
+            return f"{name}: sem amostras"
+        p = stats.percentiles()
+        return (f"{name} p50 {p['p50'] * 1000.0:.2f} ms | p95 {p['p95'] * 1000.0:.2f} ms | "
+                f"p99 {p['p99'] * 1000.0:.2f} ms")
+
+
+def from_environment(variable="N1_INSTRUMENTACAO"):
+    """
+    Cria a instrumentação compartilhada a partir da variável de ambiente:
+    vazia ou '0' desliga, '1' liga, e qualquer outro valor liga exportando
+    em JSON lines para o arquivo com esse nome.
+    """
+    value = os.environ.get(variable, "")
+    instruments = Instrumentation()
+    if value and value != "0":
+        instruments.enable(None if value == "1" else value)
+    return instruments
+
+
+# Instância compartilhada pelos módulos n1*
+instruments = from_environment()
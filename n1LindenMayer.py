@@ -1,66 +1,914 @@
-import turtle
+import argparse
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from n1Instrumentacao import instruments
+from n1Raster import EXPORT_FORMATS, export_format, export_segments
+
+def _translation_table(rules):
+    """Cria a tabela de tradução (símbolo -> sucessor) usada na reescrita"""
+    # Apenas regras de um único caractere são aplicáveis (símbolo -> sucessor)
+    return str.maketrans({char: successor for char, successor in rules.items() if len(char) == 1})
+
+def _rewrite(string, table, iterations):
+    """Aplica a tabela de tradução à string pelo número de iterações"""
+    for _ in range(iterations):
+        string = string.translate(table)
+    return string
 
 def generate_l_system(axiom, rules, iterations):
     """
     Gera a string do L-System aplicando as regras de produção ao axioma
     por um número específico de iterações.
+
+    Cada geração é reescrita com uma tabela de tradução (str.translate),
+    de modo que o custo cresce linearmente com o tamanho da saída.
+    """
+    return _rewrite(axiom, _translation_table(rules), iterations)
+
+def iter_l_system(axiom, rules, iterations, leaf_depth=0):
     """
-    result = axiom
+    Gera o L-System de forma preguiçosa, em profundidade, sem nunca
+    materializar a string completa. A memória usada é limitada pelo
+    número de iterações (uma pilha de iteradores por nível).
+
+    Args:
+        axiom: Axioma inicial
+        rules: Dicionário de regras (símbolo -> sucessor)
+        iterations: Número de iterações
+        leaf_depth: Profundidade restante a partir da qual a expansão é
+            feita de uma vez e produzida como um bloco (string). Com 0
+            (padrão), são produzidos símbolos individuais.
+    """
+    table = _translation_table(rules)
+    stack = [(iter(axiom), iterations)]
     
-    for _ in range(iterations):
-        new_result = ""
-        for char in result:
-            if char in rules:
-                new_result += rules[char]
+    while stack:
+        symbols, depth = stack[-1]
+        for char in symbols:
+            if depth > 0 and char in rules:
+                if depth <= leaf_depth:
+                    # Expande o restante de uma vez e produz um bloco
+                    yield _rewrite(char, table, depth)
+                    continue
+                # Desce um nível; o iterador atual continua depois
+                stack.append((iter(rules[char]), depth - 1))
+                break
+            yield char
+        else:
+            stack.pop()
+
+class ExpansionCache:
+    """
+    Cache de expansões do L-System indexado por (símbolo, profundidade
+    restante), com tamanho limitado (LRU). Também calcula o tamanho exato
+    da saída por símbolo e profundidade sem expandir nada.
+    """
+    def __init__(self, rules, max_size=256):
+        # Cópia das regras: o cache só é válido para este conjunto de regras
+        self.rules = {char: successor for char, successor in rules.items() if len(char) == 1}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._expansions = OrderedDict()
+        self._lengths = {}
+    
+    def expand(self, symbol, depth):
+        """Retorna a expansão do símbolo após 'depth' iterações"""
+        if depth == 0 or symbol not in self.rules:
+            return symbol
+        
+        key = (symbol, depth)
+        expansion = self._expansions.get(key)
+        if expansion is not None:
+            self.hits += 1
+            self._expansions.move_to_end(key)
+            return expansion
+        
+        self.misses += 1
+        if depth == 1:
+            expansion = self.rules[symbol]
+        else:
+            # Reaproveita as subexpansões do nível anterior
+            expansion = "".join([self.expand(char, depth - 1) for char in self.rules[symbol]])
+        
+        self._expansions[key] = expansion
+        if len(self._expansions) > self.max_size:
+            self._expansions.popitem(last=False)
+        return expansion
+    
+    def generate(self, axiom, iterations):
+        """Equivalente a generate_l_system, reaproveitando o cache"""
+        return "".join([self.expand(char, iterations) for char in axiom])
+    
+    def length(self, symbol, depth):
+        """Tamanho exato da expansão do símbolo, sem expandi-lo"""
+        if depth == 0 or symbol not in self.rules:
+            return 1
+        
+        key = (symbol, depth)
+        length = self._lengths.get(key)
+        if length is None:
+            length = sum(self.length(char, depth - 1) for char in self.rules[symbol])
+            self._lengths[key] = length
+        return length
+    
+    def generated_length(self, axiom, iterations):
+        """Tamanho exato da string gerada a partir do axioma"""
+        return sum(self.length(char, iterations) for char in axiom)
+    
+    def clear(self):
+        """Descarta as expansões armazenadas"""
+        self._expansions.clear()
+        self.hits = 0
+        self.misses = 0
+
+def l_system_length(axiom, rules, iterations):
+    """Calcula o tamanho da string do L-System sem gerá-la"""
+    return ExpansionCache(rules, max_size=0).generated_length(axiom, iterations)
+
+def _split_arguments(text):
+    """Separa os argumentos de 'a, f(b, c)' pelas vírgulas de nível zero"""
+    arguments = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            arguments.append(text[start:index].strip())
+            start = index + 1
+    arguments.append(text[start:].strip())
+    return [argument for argument in arguments if argument]
+
+def _parse_symbols(text):
+    """
+    Separa uma string de L-System paramétrico em (símbolo, argumentos),
+    por exemplo 'F(x*0.7)+A' -> [('F', ['x*0.7']), ('+', []), ('A', [])].
+    Espaços fora dos parênteses são ignorados.
+    """
+    tokens = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        index += 1
+        if char.isspace():
+            continue
+        arguments = []
+        if index < len(text) and text[index] == '(':
+            depth = 0
+            for end in range(index, len(text)):
+                if text[end] == '(':
+                    depth += 1
+                elif text[end] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
             else:
-                new_result += char
-        result = new_result
+                raise ValueError(f"Parêntese não fechado em {text!r}")
+            arguments = _split_arguments(text[index + 1:end])
+            index = end + 1
+        tokens.append((char, arguments))
+    return tokens
+
+def _follow(step, valid):
+    """
+    Para cada posição, segue step (o próximo índice a examinar; len(step)
+    encerra) até a primeira posição válida e retorna seu índice, ou -1.
+    Os ponteiros são resolvidos por saltos que dobram a cada rodada.
+    """
+    count = len(step)
+    pointer = np.append(np.where(valid, np.arange(count), np.minimum(step, count)), count)
+    while True:
+        jumped = pointer[pointer]
+        if np.array_equal(jumped, pointer):
+            break
+        pointer = jumped
+    pointer = pointer[:count]
+    pointer[pointer == count] = -1
+    return pointer
+
+class Grammar:
+    """
+    Gramática de L-System compilada, com suporte a regras estocásticas,
+    paramétricas e sensíveis ao contexto. Os símbolos são convertidos em
+    IDs inteiros e cada geração é reescrita em lote com NumPy; as escolhas
+    estocásticas usam um gerador NumPy com semente, de modo que a geração
+    é reproduzível.
+    
+    Formato das regras (dicionário predecessor -> sucessor):
+        'F': 'F[+F]F'                         determinística
+        'F': [(1, 'F[+F]F'), (2, 'F[-F]F')]   estocástica (pesos)
+        'F': ['F[+F]F', 'F[-F]F']             estocástica (pesos iguais)
+        'F(x)': 'F(x*0.7)[+F(x*0.5)]'         paramétrica
+        'F(x) : x > 1': 'F(x/2)F(x/2)'        com condição
+        'A<B>C': 'BB'                         sensível ao contexto
+    
+    Os contextos seguem os ramos, como nos L-Systems com colchetes: o
+    contexto à esquerda é o símbolo anterior no caminho até a raiz (em
+    'A[B]C', o de 'C' e o de 'B' é 'A', pois ramos inteiros são saltados),
+    e o à direita é o próximo símbolo no mesmo ramo (em 'A[B]C', o de 'A'
+    é 'C', e 'B' não tem nenhum). Os símbolos listados em 'ignore' (por
+    exemplo, '+-') também são saltados. Regras sensíveis ao contexto têm
+    prioridade sobre as demais; entre regras do mesmo tipo vale a ordem do
+    dicionário.
+    """
+    # Funções disponíveis nas expressões de parâmetros e condições
+    expression_namespace = {
+        '__builtins__': {}, 'np': np, 'pi': np.pi,
+        'sqrt': np.sqrt, 'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+        'abs': np.abs, 'exp': np.exp, 'log': np.log,
+        'minimum': np.minimum, 'maximum': np.maximum,
+    }
+    
+    def __init__(self, axiom, rules, seed=None, ignore=""):
+        self.seed = seed
+        self.symbols = []
+        self.symbol_ids = {}
+        self.arity = []
+        self._rules = []
+        self._productions = []
+        
+        axiom_tokens = _parse_symbols(axiom)
+        for char, arguments in axiom_tokens:
+            self._symbol(char, len(arguments))
+        for key, successors in rules.items():
+            self._compile_rule(key, successors)
+        # Regras sensíveis ao contexto primeiro
+        self._rules.sort(key=lambda rule: rule['left'] < 0 and rule['right'] < 0)
+        
+        self.max_arity = max(self.arity, default=0)
+        self.ignore_ids = np.array([self.symbol_ids[char] for char in ignore if char in self.symbol_ids],
+                                   dtype=np.int32)
+        self.has_context = any(rule['left'] >= 0 or rule['right'] >= 0 for rule in self._rules)
+        self._build_tables()
+        
+        self.axiom_ids = np.array([self.symbol_ids[char] for char, _ in axiom_tokens], dtype=np.int32)
+        self.axiom_params = self._empty_params(len(axiom_tokens))
+        for index, (_, arguments) in enumerate(axiom_tokens):
+            for k, argument in enumerate(arguments):
+                self.axiom_params[index, k] = eval(argument, self.expression_namespace)
+        
+        # Sem parâmetros, contexto, condições ou escolhas: basta a tabela de tradução
+        self._table = None
+        if not self.max_arity and not self.has_context and all(
+                rule['condition'] is None and len(rule['productions']) == 1 for rule in self._rules):
+            self._table = str.maketrans({self.symbols[rule['symbol']]: self._production_string(rule['productions'][0])
+                                         for rule in reversed(self._rules)})
+    
+    def _symbol(self, char, arity):
+        """Registra o símbolo (ou confere sua aridade) e retorna seu ID"""
+        symbol_id = self.symbol_ids.get(char)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[char] = symbol_id
+            self.symbols.append(char)
+            self.arity.append(arity)
+        elif self.arity[symbol_id] != arity:
+            raise ValueError(f"O símbolo {char!r} é usado com {self.arity[symbol_id]} e {arity} parâmetros")
+        return symbol_id
+    
+    def _pattern(self, text):
+        """Compila um padrão como 'F(x, y)' em (ID do símbolo, nomes das variáveis)"""
+        tokens = _parse_symbols(text)
+        if len(tokens) != 1:
+            raise ValueError(f"Padrão inválido: {text!r}")
+        char, names = tokens[0]
+        return self._symbol(char, len(names)), names
+    
+    def _compile_rule(self, key, successors):
+        """Compila uma regra (predecessor com contexto/condição -> sucessores)"""
+        pattern, _, condition = key.partition(':')
+        left = right = -1
+        left_names = right_names = []
+        if '<' in pattern:
+            left_text, pattern = pattern.split('<', 1)
+            left, left_names = self._pattern(left_text)
+        if '>' in pattern:
+            pattern, right_text = pattern.split('>', 1)
+            right, right_names = self._pattern(right_text)
+        symbol, names = self._pattern(pattern)
+        
+        if isinstance(successors, str):
+            successors = [(1.0, successors)]
+        alternatives = [(1.0, item) if isinstance(item, str) else item for item in successors]
+        weights = np.array([weight for weight, _ in alternatives], dtype=np.float64)
+        
+        productions = []
+        for _, successor in alternatives:
+            tokens = _parse_symbols(successor)
+            productions.append(len(self._productions))
+            self._productions.append({
+                'ids': [self._symbol(char, len(arguments)) for char, arguments in tokens],
+                'expressions': [[compile(argument, '<regra>', 'eval') for argument in arguments]
+                                for _, arguments in tokens],
+            })
+        
+        self._rules.append({
+            'symbol': symbol,
+            'left': left,
+            'right': right,
+            'names': (names, left_names, right_names),
+            'condition': compile(condition.strip(), '<regra>', 'eval') if condition.strip() else None,
+            'productions': np.array(productions),
+            'cumulative': np.cumsum(weights) / weights.sum(),
+        })
+    
+    def _build_tables(self):
+        """
+        Concatena os sucessores de todas as produções em uma única tabela.
+        Depois das produções das regras vem uma produção identidade por
+        símbolo (para os símbolos sem regra aplicável).
+        """
+        self._identity_base = len(self._productions)
+        successors = [production['ids'] for production in self._productions]
+        successors += [[symbol_id] for symbol_id in range(len(self.symbols))]
+        lengths = np.array([len(ids) for ids in successors], dtype=np.int64)
+        self._successor_length = lengths
+        self._successor_start = np.cumsum(lengths) - lengths
+        self._successor_ids = np.array([symbol_id for ids in successors for symbol_id in ids], dtype=np.int32)
+    
+    def _production_string(self, production):
+        return "".join(self.symbols[symbol_id] for symbol_id in self._productions[production]['ids'])
+    
+    def _empty_params(self, count):
+        return np.full((count, self.max_arity), np.nan)
+    
+    def _matching_brackets(self, ids):
+        """Posição do colchete correspondente a cada '[' e ']' (-1 nos demais e nos sem par)"""
+        match = np.full(len(ids), -1, dtype=np.int64)
+        opening = self.symbol_ids.get('[', -1)
+        closing = self.symbol_ids.get(']', -1)
+        brackets = np.flatnonzero((ids == opening) | (ids == closing))
+        stack = []
+        for index, symbol_id in zip(brackets.tolist(), ids[brackets].tolist()):
+            if symbol_id == opening:
+                stack.append(index)
+            elif stack:
+                start = stack.pop()
+                match[start] = index
+                match[index] = start
+        return match
+    
+    def _neighbors(self, ids):
+        """
+        Índices do contexto à esquerda e à direita de cada símbolo (-1 se
+        não houver), saltando ramos inteiros e os símbolos ignorados.
+        """
+        count = len(ids)
+        positions = np.arange(count)
+        match = self._matching_brackets(ids)
+        opening = (ids == self.symbol_ids.get('[', -1)) & (match >= 0)
+        closing = (ids == self.symbol_ids.get(']', -1)) & (match >= 0)
+        valid = ~np.isin(ids, self.ignore_ids) & ~np.isin(ids, [self.symbol_ids.get(char, -1) for char in "[]"])
+        
+        # À esquerda: um ']' salta o ramo inteiro; um '[' leva ao símbolo pai
+        step = np.where(closing, match - 1, positions - 1)
+        left = _follow(np.where(step < 0, count, step), valid)
+        left = np.concatenate(([-1], left[:-1]))
+        
+        # À direita: um '[' salta o ramo inteiro; um ']' termina o ramo atual
+        step = np.where(opening, match + 1, positions + 1)
+        step[closing] = count
+        right = _follow(step, valid)
+        right = np.concatenate((right[1:], [-1]))
+        return left, right
+    
+    def _bind(self, rule, params, indices, left, right):
+        """Variáveis das regras paramétricas como arrays (uma entrada por ocorrência)"""
+        names, left_names, right_names = rule['names']
+        variables = dict(self.expression_namespace)
+        for k, name in enumerate(names):
+            variables[name] = params[indices, k]
+        for k, name in enumerate(left_names):
+            variables[name] = params[left[indices], k]
+        for k, name in enumerate(right_names):
+            variables[name] = params[right[indices], k]
+        return variables
     
-    return result
+    def step(self, ids, params, rng):
+        """Aplica uma geração de reescrita a (IDs, parâmetros)"""
+        count = len(ids)
+        production = self._identity_base + ids.astype(np.int64)
+        assigned = np.zeros(count, dtype=bool)
+        left = right = None
+        if self.has_context:
+            left, right = self._neighbors(ids)
+        matches = []
+        
+        for rule in self._rules:
+            mask = (ids == rule['symbol']) & ~assigned
+            if rule['left'] >= 0:
+                mask &= (left >= 0) & (ids[left] == rule['left'])
+            if rule['right'] >= 0:
+                mask &= (right >= 0) & (ids[right] == rule['right'])
+            indices = np.flatnonzero(mask)
+            if len(indices) == 0:
+                continue
+            if rule['condition'] is not None:
+                accepted = eval(rule['condition'], self._bind(rule, params, indices, left, right))
+                indices = indices[np.broadcast_to(accepted, indices.shape)]
+            
+            if len(rule['productions']) == 1:
+                production[indices] = rule['productions'][0]
+            else:
+                # Escolha estocástica em lote para todas as ocorrências
+                choice = np.searchsorted(rule['cumulative'], rng.random(len(indices)), side='right')
+                production[indices] = rule['productions'][np.minimum(choice, len(rule['productions']) - 1)]
+            assigned[indices] = True
+            matches.append((rule, indices))
+        
+        # Cada posição da saída lê o sucessor da produção escolhida para seu símbolo
+        lengths = self._successor_length[production]
+        offsets = np.cumsum(lengths) - lengths
+        gather = np.repeat(self._successor_start[production] - offsets, lengths)
+        gather += np.arange(len(gather))
+        new_ids = self._successor_ids[gather]
+        
+        if not self.max_arity:
+            return new_ids, self._empty_params(len(new_ids))
+        
+        # Símbolos copiados mantêm os parâmetros; os produzidos são avaliados
+        source = np.repeat(np.arange(count), lengths)
+        new_params = self._empty_params(len(new_ids))
+        copied = production[source] >= self._identity_base
+        new_params[copied] = params[source[copied]]
+        for rule, indices in matches:
+            for production_id in rule['productions']:
+                occurrences = indices[production[indices] == production_id]
+                if len(occurrences) == 0:
+                    continue
+                variables = self._bind(rule, params, occurrences, left, right)
+                for j, expressions in enumerate(self._productions[production_id]['expressions']):
+                    rows = offsets[occurrences] + j
+                    for k, expression in enumerate(expressions):
+                        new_params[rows, k] = eval(expression, variables)
+        return new_ids, new_params
+    
+    def generate(self, iterations, seed=None):
+        """
+        Gera o L-System e retorna (IDs, parâmetros): um array int32 de IDs
+        de símbolos e um array (N, max_arity) com os parâmetros (NaN onde
+        não se aplica). A mesma semente produz sempre o mesmo resultado.
+        """
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        ids = self.axiom_ids
+        params = self.axiom_params
+        for _ in range(iterations):
+            ids, params = self.step(ids, params, rng)
+        return ids, params
+    
+    def to_symbols(self, ids):
+        """Converte os IDs na string de símbolos, sem os parâmetros"""
+        codes = np.array([ord(char) for char in self.symbols], dtype=np.uint32)
+        return codes[ids].astype('<u4').tobytes().decode('utf-32-le')
+    
+    def to_string(self, ids, params):
+        """Converte (IDs, parâmetros) em texto, por exemplo 'F(1.5)+F(1.05)'"""
+        parts = []
+        for symbol_id, row in zip(ids.tolist(), params.tolist()):
+            arity = self.arity[symbol_id]
+            if arity:
+                parts.append(f"{self.symbols[symbol_id]}({','.join(f'{value:g}' for value in row[:arity])})")
+            else:
+                parts.append(self.symbols[symbol_id])
+        return "".join(parts)
+    
+    def generate_symbols(self, iterations, seed=None):
+        """Gera o L-System e retorna apenas a string de símbolos"""
+        if self._table is not None:
+            return _rewrite("".join(self.symbols[symbol_id] for symbol_id in self.axiom_ids),
+                            self._table, iterations)
+        ids, _ = self.generate(iterations, seed)
+        return self.to_symbols(ids)
 
-def draw_l_system(l_system, angle, distance):
+def _match_brackets(codes):
+    """
+    Associa cada '[' ao seu ']' usando uma pilha explícita, percorrendo
+    apenas as posições dos colchetes. Retorna uma lista, por nível de
+    aninhamento, de pares (índices de abertura, índices de fechamento),
+    os índices dos ']' sem '[' correspondente e os dos '[' que ficaram
+    abertos no final.
+    """
+    brackets = np.flatnonzero((codes == ord('[')) | (codes == ord(']')))
+    stack = []
+    levels = []
+    unmatched = []
+    
+    for index, code in zip(brackets.tolist(), codes[brackets].tolist()):
+        if code == ord('['):
+            stack.append(index)
+        elif stack:
+            depth = len(stack) - 1
+            while depth >= len(levels):
+                levels.append(([], []))
+            levels[depth][0].append(stack.pop())
+            levels[depth][1].append(index)
+        else:
+            unmatched.append(index)
+    
+    return [(np.array(opens), np.array(closes)) for opens, closes in levels], unmatched, stack
+
+def _cumsum_with_restore(deltas, levels):
+    """
+    Soma acumulada dos incrementos em que cada ']' restaura o valor
+    acumulado no '[' correspondente. Os colchetes são resolvidos do nível
+    mais interno para o mais externo, com uma soma acumulada por nível.
     """
-    Desenha o L-System usando a biblioteca turtle.
+    deltas = deltas.copy()
+    
+    for opens, closes in reversed(levels):
+        total = np.cumsum(deltas, axis=0)
+        deltas[closes] = total[opens] - total[closes]
+    
+    return np.cumsum(deltas, axis=0)
+
+def _interpret_codes(codes, levels, angle, distance, start, heading):
+    """
+    Interpreta um trecho cujos colchetes já foram associados (levels).
+    Retorna os segmentos, as posições antes de cada símbolo (mais a
+    final) e a orientação, em graus, depois de cada símbolo.
+    """
+    # Orientações: '+' gira à direita (horário), '-' à esquerda
+    turns = np.zeros(len(codes))
+    turns[codes == ord('+')] = -angle
+    turns[codes == ord('-')] = angle
+    headings = heading + _cumsum_with_restore(turns, levels)
+    radians = np.radians(headings)
+    
+    # Posições: cada 'F' avança 'distance' na orientação corrente
+    forward = codes == ord('F')
+    steps = np.zeros((len(codes), 2))
+    steps[forward, 0] = distance * np.cos(radians[forward])
+    steps[forward, 1] = distance * np.sin(radians[forward])
+    positions = np.empty((len(codes) + 1, 2))
+    positions[0] = start
+    positions[1:] = start + _cumsum_with_restore(steps, levels)
+    
+    # Cada segmento vai da posição antes do 'F' até a posição depois dele
+    indices = np.flatnonzero(forward)
+    segments = np.empty((len(indices), 2, 2), dtype=np.float32)
+    segments[:, 0] = positions[indices]
+    segments[:, 1] = positions[indices + 1]
+    return segments, positions, headings
+
+def _interpret_chunk(text, angle, distance, state):
+    """
+    Interpreta um trecho do L-System a partir do estado (posição,
+    orientação, pilha) deixado pelo trecho anterior e atualiza o estado.
+    Os ']' que fecham colchetes de trechos anteriores dividem o trecho em
+    partes independentes; os '[' que ficam abertos são empilhados.
+    """
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    levels, unmatched, unclosed = _match_brackets(codes)
+    position, heading, stack = state
+    parts = []
+    begin = 0
+    
+    for close in unmatched + [len(codes)]:
+        piece = codes[begin:close]
+        if len(piece):
+            # Os colchetes da parte estão todos nela; só ajusta os índices
+            piece_levels = []
+            for opens, closes in levels:
+                inside = (opens >= begin) & (opens < close)
+                if inside.any():
+                    piece_levels.append((opens[inside] - begin, closes[inside] - begin))
+            segments, positions, headings = _interpret_codes(piece, piece_levels, angle, distance,
+                                                             position, heading)
+            parts.append(segments)
+            if close == len(codes):
+                # Só a última parte pode deixar '[' abertos
+                stack.extend((positions[index - begin].copy(), headings[index - begin])
+                             for index in unclosed)
+            position, heading = positions[-1], headings[-1]
+        if close < len(codes) and stack:
+            # Um ']' sem '[' correspondente é ignorado, como em draw_l_system
+            position, heading = stack.pop()
+        begin = close + 1
+    
+    state[0], state[1] = position, heading
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts) if parts else np.empty((0, 2, 2), dtype=np.float32)
+
+def iter_segments(l_system, angle, distance, start=(0.0, 0.0), heading=90.0, chunk_size=65536):
+    """
+    Interpreta o L-System como interpret_l_system, mas produz os segmentos
+    em blocos: um iterável de símbolos (ou de blocos de símbolos, como o
+    gerador de iter_l_system) é lido em trechos de cerca de chunk_size
+    símbolos, e a posição, a orientação e a pilha de colchetes passam de
+    um trecho para o seguinte. A memória fica limitada pelo tamanho do
+    trecho e pela profundidade dos colchetes. Uma string é interpretada
+    de uma vez.
+    """
+    state = [np.asarray(start, dtype=np.float64), float(heading), []]
+    if isinstance(l_system, str):
+        if l_system:
+            yield _interpret_chunk(l_system, angle, distance, state)
+        return
+    
+    buffer = []
+    size = 0
+    for chunk in l_system:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield _interpret_chunk("".join(buffer), angle, distance, state)
+            buffer = []
+            size = 0
+    if size:
+        yield _interpret_chunk("".join(buffer), angle, distance, state)
+
+def interpret_l_system(l_system, angle, distance, start=(0.0, 0.0), heading=90.0):
+    """
+    Interpreta o L-System (F, +, -, [, ]) sem desenhar nada, com a mesma
+    semântica de draw_l_system, e retorna os segmentos de linha como um
+    array float32 de formato (N, 2, 2): N segmentos, cada um com os
+    pontos inicial e final (x, y).
     
     Args:
-        l_system: String gerada pelo L-System
+        l_system: String gerada pelo L-System, ou iterável de símbolos
+            (interpretado em trechos por iter_segments)
         angle: Ângulo de rotação (em graus)
         distance: Distância para avançar ao desenhar uma linha
+        start: Posição inicial da tartaruga
+        heading: Orientação inicial (em graus, 90 aponta para cima)
     """
-    stack = []
+    blocks = list(iter_segments(l_system, angle, distance, start, heading))
+    if len(blocks) == 1:
+        return blocks[0]
+    return np.concatenate(blocks) if blocks else np.empty((0, 2, 2), dtype=np.float32)
+
+class LSystemSession:
+    """
+    Sessão incremental de ajuste de um L-System 2D: guarda, para cada par
+    (símbolo, profundidade), a expansão e a geometria local (segmentos a
+    partir da origem com orientação 0, posição final e giro total), e monta
+    cada geração a partir dessas peças.
+    
+    Ir de N para N + 1 iterações só compõe as peças de profundidade N + 1
+    a partir das de profundidade N (uma passada sobre a saída). Ao mudar
+    uma regra, só as peças que dependem do símbolo alterado são
+    descartadas; as demais são reaproveitadas na recomposição.
+    
+    As regras de '[' e ']' não são suportadas e os sucessores precisam ter
+    colchetes balanceados, para que cada peça seja independente das outras.
+    
+    Args:
+        axiom: Axioma inicial
+        rules: Dicionário de regras (símbolo -> sucessor)
+        angle: Ângulo de rotação (em graus)
+        distance: Distância de cada 'F'
+        start: Posição inicial da tartaruga
+        heading: Orientação inicial (em graus, 90 aponta para cima)
+    """
+    def __init__(self, axiom, rules, angle=25, distance=10, start=(0.0, 0.0), heading=90.0):
+        self.axiom = axiom
+        self.angle = angle
+        self.distance = distance
+        self.start = start
+        self.heading = heading
+        self.rules = {}
+        self.hits = 0
+        self.misses = 0
+        self._strings = {}
+        self._pieces = {}
+        for symbol, successor in rules.items():
+            self._check_rule(symbol, successor)
+            self.rules[symbol] = successor
+    
+    @staticmethod
+    def _check_rule(symbol, successor):
+        """Rejeita regras que tornariam as peças dependentes umas das outras"""
+        if len(symbol) != 1 or symbol in "[]":
+            raise ValueError(f"Regra inválida para a sessão incremental: {symbol!r}")
+        depth = 0
+        for char in successor:
+            depth += (char == '[') - (char == ']')
+            if depth < 0:
+                break
+        if depth != 0:
+            raise ValueError(f"Sucessor com colchetes desbalanceados: {symbol}={successor}")
     
-    for symbol in l_system:
+    def _primitive(self, symbol):
+        """Peça de um símbolo que não é reescrito: 'F' avança, '+' e '-' giram"""
         if symbol == 'F':
-            # Desenhar uma linha para frente
-            turtle.forward(distance)
-        elif symbol == '+':
-            # Girar à direita pelo ângulo especificado
-            turtle.right(angle)
-        elif symbol == '-':
-            # Girar à esquerda pelo ângulo especificado
-            turtle.left(angle)
-        elif symbol == '[':
-            # Salvar a posição e orientação atuais
-            stack.append((turtle.position(), turtle.heading()))
-        elif symbol == ']':
-            # Restaurar a posição e orientação anteriores
-            if stack:
-                position, heading = stack.pop()
-                turtle.penup()
-                turtle.goto(position)
-                turtle.setheading(heading)
-                turtle.pendown()
-
-def main():
-    # Configurações do L-System conforme o enunciado
-    axiom = "F"
-    rules = {"F": "F[+F]F[-F]F"}
-    iterations = 4
-    angle = 25
-    distance = 10
+            segments = np.array([[[0.0, 0.0], [self.distance, 0.0]]])
+            return segments, np.array([self.distance, 0.0]), 0.0
+        turn = -self.angle if symbol == '+' else self.angle if symbol == '-' else 0.0
+        return np.empty((0, 2, 2)), np.zeros(2), turn
+    
+    def _piece(self, symbol, depth):
+        """Geometria local do símbolo após 'depth' iterações (em cache)"""
+        if depth == 0 or symbol not in self.rules:
+            return self._primitive(symbol)
+        key = (symbol, depth)
+        piece = self._pieces.get(key)
+        if piece is not None:
+            self.hits += 1
+            return piece
+        self.misses += 1
+        segments, end, turn = self._compose(self.rules[symbol], depth - 1, (0.0, 0.0), 0.0)
+        piece = self._pieces[key] = (segments, end, turn)
+        return piece
+    
+    def _compose(self, symbols, depth, start, heading):
+        """
+        Junta as peças dos símbolos (na profundidade dada) a partir da
+        posição e orientação iniciais, resolvendo os colchetes deste nível.
+        Retorna os segmentos, a posição final e o giro total.
+        """
+        position = np.asarray(start, dtype=np.float64)
+        current = heading
+        stack = []
+        parts = []
+        
+        for char in symbols:
+            if char == '[':
+                stack.append((position, current))
+                continue
+            if char == ']':
+                # Um ']' sem '[' correspondente é ignorado, como em interpret_l_system
+                if stack:
+                    position, current = stack.pop()
+                continue
+            segments, end, turn = self._piece(char, depth)
+            radians = math.radians(current)
+            cos, sin = math.cos(radians), math.sin(radians)
+            rotation = np.array([[cos, -sin], [sin, cos]])
+            if len(segments):
+                parts.append(segments @ rotation.T + position)
+            position = position + rotation @ end
+            current += turn
+        
+        segments = np.concatenate(parts) if parts else np.empty((0, 2, 2))
+        return segments, position, current - heading
+    
+    def _string(self, symbol, depth):
+        """Expansão do símbolo após 'depth' iterações (em cache)"""
+        if depth == 0 or symbol not in self.rules:
+            return symbol
+        key = (symbol, depth)
+        expansion = self._strings.get(key)
+        if expansion is None:
+            expansion = "".join([self._string(char, depth - 1) for char in self.rules[symbol]])
+            self._strings[key] = expansion
+        return expansion
+    
+    def string(self, iterations):
+        """String da geração 'iterations' (igual a generate_l_system)"""
+        return "".join([self._string(char, iterations) for char in self.axiom])
+    
+    def segments(self, iterations):
+        """Segmentos (N, 2, 2) float32 da geração, como interpret_l_system"""
+        segments = self._compose(self.axiom, iterations, self.start, self.heading)[0]
+        return segments.astype(np.float32)
+    
+    def set_rule(self, symbol, successor=None):
+        """
+        Troca (ou remove, com successor=None) a regra do símbolo e descarta
+        só as peças que dependem dele: na profundidade d, as dos símbolos que
+        alcançam o símbolo alterado em menos de d reescritas.
+        """
+        if successor is None:
+            self.rules.pop(symbol, None)
+        else:
+            self._check_rule(symbol, successor)
+            self.rules[symbol] = successor
+        
+        cached = [depth for _, depth in self._pieces] + [depth for _, depth in self._strings]
+        affected = {symbol}
+        for depth in range(1, max(cached, default=0) + 1):
+            for key in ((char, depth) for char in affected):
+                self._pieces.pop(key, None)
+                self._strings.pop(key, None)
+            # Símbolos cujas peças de profundidade depth + 1 usam uma peça afetada
+            affected = affected | {char for char, successor in self.rules.items()
+                                   if not affected.isdisjoint(successor)}
+
+def draw_segments(segments):
+    """
+    Desenha com a biblioteca turtle os segmentos produzidos por
+    interpret_l_system (um array (N, 2, 2) ou um iterável de arrays, como
+    o de iter_segments). A atualização da tela é feita uma única vez ao
+    final, e a caneta só é levantada quando o segmento não continua o
+    anterior.
+    """
+    # Importado só aqui: turtle depende do tkinter, ausente em máquinas sem tela
+    import turtle
+    
+    if isinstance(segments, np.ndarray):
+        segments = (segments,)
+    
+    previous_tracer = turtle.tracer()
+    turtle.tracer(0, 0)
+    
+    last = None
+    count = 0
+    for block in segments:
+        with instruments.timer('draw'):
+            for start, end in block.tolist():
+                if start != last:
+                    turtle.penup()
+                    turtle.goto(start)
+                    turtle.pendown()
+                turtle.goto(end)
+                last = end
+        count += len(block)
+    
+    with instruments.timer('draw'):
+        turtle.update()
+    turtle.tracer(previous_tracer)
+    return count
+
+def _timed(name, blocks):
+    """Mede, na instrumentação, o tempo gasto para produzir cada bloco"""
+    blocks = iter(blocks)
+    while True:
+        with instruments.timer(name):
+            block = next(blocks, None)
+        if block is None:
+            return
+        yield block
+
+def draw_l_system(l_system, angle, distance):
+    """
+    Desenha o L-System usando a biblioteca turtle, a partir da posição e
+    orientação atuais da tartaruga. Os segmentos são calculados em blocos
+    por iter_segments e desenhados por draw_segments à medida que ficam
+    prontos, então um gerador não é materializado por inteiro.
+    
+    Args:
+        l_system: String gerada pelo L-System, ou qualquer iterável de
+            símbolos (por exemplo, o gerador de iter_l_system)
+        angle: Ângulo de rotação (em graus)
+        distance: Distância para avançar ao desenhar uma linha
+    """
+    import turtle
+    
+    blocks = iter_segments(l_system, angle, distance, start=turtle.position(), heading=turtle.heading())
+    count = draw_segments(_timed('interpret', blocks))
+    instruments.count('segments_drawn', count)
+    instruments.end_frame()
+
+def parse_rule(text):
+    """Converte uma regra no formato 'F=F[+F]F[-F]F' em (símbolo, sucessor)"""
+    symbol, separator, successor = text.partition('=')
+    if not separator or len(symbol) != 1:
+        raise argparse.ArgumentTypeError(f"Regra inválida: {text!r} (use o formato X=sucessor)")
+    return symbol, successor
+
+def parse_args(argv=None):
+    """Lê os parâmetros do L-System da linha de comando"""
+    parser = argparse.ArgumentParser(description="Gera e desenha um L-System 2D.")
+    parser.add_argument('--axiom', default="F", help="Axioma inicial")
+    parser.add_argument('--rule', dest='rules', action='append', type=parse_rule,
+                        help="Regra de produção no formato X=sucessor (pode ser repetida)")
+    parser.add_argument('--iterations', type=int, default=4, help="Número de iterações")
+    parser.add_argument('--angle', type=float, default=25, help="Ângulo de rotação (em graus)")
+    parser.add_argument('--distance', type=float, default=10, help="Distância de cada passo")
+    parser.add_argument('--output', help="Arquivo de saída (.png, .ppm, .svg ou .n1g); "
+                                         "sem ele, o desenho é feito na janela do turtle")
+    parser.add_argument('--width', type=int, default=800, help="Largura da imagem")
+    parser.add_argument('--height', type=int, default=800, help="Altura da imagem")
+    parser.add_argument('--stats', action='store_true', help="Mede e mostra o tempo de cada etapa do desenho")
+    parser.add_argument('--stats-jsonl', help="Também exporta as medidas neste arquivo JSON lines")
+    args = parser.parse_args(argv)
+    if args.output and export_format(args.output) is None:
+        parser.error(f"--output precisa terminar em .{', .'.join(EXPORT_FORMATS)} (recebido {args.output!r})")
+    args.rules = dict(args.rules) if args.rules else {"F": "F[+F]F[-F]F"}
+    return args
+
+def render_to_file(args):
+    """Gera o L-System e exporta o desenho sem abrir janela (modo headless)"""
+    l_system = generate_l_system(args.axiom, args.rules, args.iterations)
+    segments = interpret_l_system(l_system, args.angle, args.distance)
+    export_segments(args.output, segments, args.width, args.height)
+    print(f"{len(segments)} segmentos salvos em {args.output}")
+
+def main(argv=None):
+    # Configurações do L-System (padrão conforme o enunciado)
+    args = parse_args(argv)
+    axiom = args.axiom
+    rules = args.rules
+    iterations = args.iterations
+    angle = args.angle
+    distance = args.distance
+    if args.stats or args.stats_jsonl:
+        instruments.enable(args.stats_jsonl)
+    
+    if args.output:
+        render_to_file(args)
+        return
     
     # Configurações da tartaruga
-    turtle.setup(800, 800)
+    import turtle
+    turtle.setup(args.width, args.height)
     turtle.title("L-System Árvore Fractal")
     turtle.bgcolor("black")
     turtle.color("green")
@@ -73,11 +921,15 @@ def main():
     turtle.pendown()
     
     # Gerar a string do L-System
+    print(f"Iteração {iterations} produzirá {l_system_length(axiom, rules, iterations)} símbolos")
     l_system = generate_l_system(axiom, rules, iterations)
     print(f"L-System gerado: {l_system}")
     
     # Desenhar o L-System
     draw_l_system(l_system, angle, distance)
+    if instruments.enabled:
+        for name in ('interpret', 'draw'):
+            print(instruments.format_line(name))
     
     # Manter a janela aberta até ser fechada manualmente
     turtle.exitonclick()
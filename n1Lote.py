@@ -0,0 +1,188 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from n1LindenMayer import generate_l_system, interpret_l_system, parse_rule
+from n1Raster import export_segments
+
+
+def expand_grid(axiom="F", rule_variants=None, angles=(25,), distances=(10,), iterations=(4,)):
+    """
+    Gera a lista de configurações de L-System a partir do produto cartesiano
+    das variantes de regras, ângulos, distâncias e números de iterações.
+    """
+    if not rule_variants:
+        rule_variants = [{"F": "F[+F]F[-F]F"}]
+
+    return [
+        {'axiom': axiom, 'rules': dict(rules), 'angle': angle,
+         'distance': distance, 'iterations': count}
+        for rules, angle, distance, count in itertools.product(rule_variants, angles, distances, iterations)
+    ]
+
+
+def render_job(job):
+    """
+    Executa uma configuração (geração, interpretação e renderização headless)
+    e retorna o resultado com o tempo de cada etapa. Roda no processo filho.
+    """
+    config = job['config']
+    timings = {}
+
+    start = time.perf_counter()
+    l_system = generate_l_system(config['axiom'], config['rules'], config['iterations'])
+    timings['generate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    segments = interpret_l_system(l_system, config['angle'], config['distance'])
+    timings['interpret'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    export_segments(job['path'], segments, job['width'], job['height'])
+    timings['render'] = time.perf_counter() - start
+
+    return {
+        'index': job['index'],
+        'config': config,
+        'file': os.path.basename(job['path']),
+        'symbols': len(l_system),
+        'segments': len(segments),
+        'seconds': timings,
+    }
+
+
+def render_jobs(jobs):
+    """
+    Executa um bloco de jobs no processo filho. Um job que falha não
+    interrompe os demais: o erro é registrado no seu resultado.
+    """
+    results = []
+    for job in jobs:
+        try:
+            results.append(render_job(job))
+        except Exception as error:
+            results.append(_failed(job, error))
+    return results
+
+
+def _failed(job, error):
+    """Resultado de um job que falhou, com a mensagem do erro"""
+    return {
+        'index': job['index'],
+        'config': job['config'],
+        'file': None,
+        'error': f"{type(error).__name__}: {error}",
+    }
+
+
+def run_batch(configs, output_dir, workers=None, chunksize=4, image_format='png',
+              width=800, height=800, progress=True):
+    """
+    Distribui as configurações entre processos (ProcessPoolExecutor), em
+    blocos de chunksize, e salva uma imagem por configuração em output_dir,
+    junto com manifest.json contendo configurações, arquivos e tempos de
+    cada job. O progresso é mostrado na ordem em que os blocos terminam;
+    os jobs que falham ficam no manifesto com o erro, e o manifesto é
+    gravado mesmo assim.
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize precisa ser pelo menos 1 (recebido {chunksize})")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        {'index': index, 'config': config, 'width': width, 'height': height,
+         'path': os.path.join(output_dir, f"{index:05d}.{image_format}")}
+        for index, config in enumerate(configs)
+    ]
+    chunks = [jobs[index:index + chunksize] for index in range(0, len(jobs), chunksize)]
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(render_jobs, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except Exception as error:
+                # O processo filho morreu ou o bloco não pôde ser enviado
+                chunk_results = [_failed(job, error) for job in futures[future]]
+            for result in chunk_results:
+                results.append(result)
+                if not progress:
+                    continue
+                if 'error' in result:
+                    print(f"[{len(results)}/{len(jobs)}] job {result['index']}: {result['error']}")
+                else:
+                    print(f"[{len(results)}/{len(jobs)}] {result['file']}: "
+                          f"{result['segments']} segmentos em {sum(result['seconds'].values()):.3f} s")
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: result['index'])
+    failed = sum('error' in result for result in results)
+    manifest = {
+        'jobs': results,
+        'count': len(results),
+        'failed': failed,
+        'workers': workers or os.cpu_count(),
+        'seconds': elapsed,
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+    if progress:
+        rate = len(results) / elapsed if elapsed > 0 else float('inf')
+        print(f"{len(results)} configurações em {elapsed:.2f} s ({rate:.1f} por segundo)")
+        if failed:
+            print(f"{failed} configurações falharam (veja manifest.json)")
+    return manifest
+
+
+def parse_variant(text):
+    """Converte 'X=sucessor Y=sucessor' em um dicionário de regras"""
+    return dict(parse_rule(rule) for rule in text.split())
+
+
+def parse_args(argv=None):
+    """Lê a grade de parâmetros (ou um arquivo de configurações) da linha de comando"""
+    parser = argparse.ArgumentParser(description="Gera e renderiza lotes de L-Systems em paralelo.")
+    parser.add_argument('output_dir', help="Diretório de saída")
+    parser.add_argument('--configs', help="Arquivo JSON com uma lista de configurações "
+                                          "(axiom, rules, angle, distance, iterations)")
+    parser.add_argument('--axiom', default="F", help="Axioma inicial")
+    parser.add_argument('--variant', dest='variants', action='append', type=parse_variant,
+                        help="Variante de regras, ex.: \"X=F-[[X]+X]+F[+FX]-X F=FF\" (pode ser repetida)")
+    parser.add_argument('--angle', type=float, nargs='+', default=[25], help="Ângulos (em graus)")
+    parser.add_argument('--distance', type=float, nargs='+', default=[10], help="Distâncias")
+    parser.add_argument('--iterations', type=int, nargs='+', default=[4], help="Números de iterações")
+    parser.add_argument('--workers', type=int, help="Número de processos (padrão: número de CPUs)")
+    parser.add_argument('--chunksize', type=int, default=4, help="Configurações enviadas por vez a cada processo")
+    parser.add_argument('--format', default='png', choices=['png', 'ppm', 'svg', 'n1g'], help="Formato das imagens")
+    parser.add_argument('--width', type=int, default=800, help="Largura das imagens")
+    parser.add_argument('--height', type=int, default=800, help="Altura das imagens")
+    parser.add_argument('--quiet', action='store_true', help="Não mostrar o progresso")
+    args = parser.parse_args(argv)
+    if args.chunksize < 1:
+        parser.error(f"--chunksize precisa ser pelo menos 1 (recebido {args.chunksize})")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.configs:
+        with open(args.configs) as file:
+            configs = json.load(file)
+    else:
+        configs = expand_grid(args.axiom, args.variants, args.angle, args.distance, args.iterations)
+
+    manifest = run_batch(configs, args.output_dir, workers=args.workers, chunksize=args.chunksize,
+                         image_format=args.format, width=args.width, height=args.height,
+                         progress=not args.quiet)
+    if manifest['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
+import os
 import numpy as np
+import argparse
+import ctypes
+import hashlib
 import math
+import struct
 import sys
+import time
+
+from n1Espacial import frustum_planes
+from n1Instrumentacao import instruments
+from n1Raster import render_mesh, write_png, write_ppm
 
 # Shaders de vértice e fragmento em GLSL
 vertex_shader = """
@@ -74,127 +80,770 @@ void main() {
 }
 """
 
-def create_sphere(radius, num_slices, num_stacks):
-    vertices = []
-    normals = []
-    indices = []
+# Variante instanciada: a matriz do modelo e a cor vêm de atributos por
+# instância (locais 2-5 para a mat4, 6 para a cor) em vez de uniforms
+instanced_vertex_shader = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in mat4 instanceModel;
+layout(location = 6) in vec3 instanceColor;
+
+uniform mat4 view;
+uniform mat4 projection;
+
+out vec3 fragNormal;
+out vec3 fragPosition;
+out vec3 objectColor;
+
+void main() {
+    gl_Position = projection * view * instanceModel * vec4(position, 1.0);
+    fragPosition = vec3(instanceModel * vec4(position, 1.0));
+    fragNormal = mat3(transpose(inverse(instanceModel))) * normal;
+    objectColor = instanceColor;
+}
+"""
+
+# Mesmo modelo de iluminação, com a cor do objeto vinda do vertex shader
+instanced_fragment_shader = fragment_shader.replace("uniform vec3 objectColor;", "in vec3 objectColor;")
+
+# Cache de malhas de esfera, indexado por (raio, fatias, pilhas)
+_sphere_cache = {}
+
+def _build_sphere(radius, num_slices, num_stacks):
+    """Calcula vértices, normais e índices da esfera com operações vetorizadas"""
+    # Ângulos de cada vértice: linhas são pilhas (phi), colunas são fatias (theta)
+    phi = (math.pi * np.arange(num_stacks + 1) / num_stacks)[:, None]
+    theta = (2.0 * math.pi * np.arange(num_slices + 1) / num_slices)[None, :]
     
-    # Gerar vértices e normais
-    for i in range(num_stacks + 1):
-        phi = math.pi * i / num_stacks
-        for j in range(num_slices + 1):
-            theta = 2.0 * math.pi * j / num_slices
-            
-            x = radius * math.sin(phi) * math.cos(theta)
-            y = radius * math.sin(phi) * math.sin(theta)
-            z = radius * math.cos(phi)
-            
-            vertices.extend([x, y, z])
-            
-            # Normal (normalizado)
-            normal_len = math.sqrt(x*x + y*y + z*z)
-            nx = x / normal_len
-            ny = y / normal_len
-            nz = z / normal_len
-            normals.extend([nx, ny, nz])
-    
-    # Gerar índices
-    for i in range(num_stacks):
-        for j in range(num_slices):
-            first = i * (num_slices + 1) + j
-            second = first + num_slices + 1
-            
-            # Primeiro triângulo
-            indices.extend([first, second, first + 1])
-            
-            # Segundo triângulo
-            indices.extend([second, second + 1, first + 1])
+    sin_phi = np.sin(phi)
+    positions = np.empty((num_stacks + 1, num_slices + 1, 3))
+    positions[..., 0] = radius * sin_phi * np.cos(theta)
+    positions[..., 1] = radius * sin_phi * np.sin(theta)
+    positions[..., 2] = radius * np.cos(phi)
+    
+    # Numa esfera centrada na origem, a normal é a posição dividida pelo raio
+    normals = positions / radius
     
-    return np.array(vertices, dtype=np.float32), np.array(normals, dtype=np.float32), np.array(indices, dtype=np.uint32)
+    # Dois triângulos por quadrilátero da grade
+    first = (np.arange(num_stacks)[:, None] * (num_slices + 1) + np.arange(num_slices)[None, :]).ravel()
+    second = first + num_slices + 1
+    indices = np.stack([first, second, first + 1, second, second + 1, first + 1], axis=1)
+    
+    return (positions.astype(np.float32).ravel(),
+            normals.astype(np.float32).ravel(),
+            indices.astype(np.uint32).ravel())
+
+def _load_sphere(path):
+    """Lê a malha do arquivo .npz; retorna None se ele não existir ou for inválido"""
+    try:
+        with np.load(path) as data:
+            return (data['vertices'], data['normals'], data['indices'])
+    except Exception:
+        # Ausente, truncado ou de outra versão: a malha é refeita e regravada
+        return None
 
-def compile_shader(shader_code, shader_type):
-    shader = glCreateShader(shader_type)
-    glShaderSource(shader, shader_code)
-    glCompileShader(shader)
+def _store_sphere(path, mesh):
+    """Grava a malha no arquivo .npz (de forma atômica, por causa de processos concorrentes)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, 'wb') as file:
+        np.savez(file, vertices=mesh[0], normals=mesh[1], indices=mesh[2])
+    os.replace(temporary, path)
+
+def create_sphere(radius, num_slices, num_stacks, cache_dir=None):
+    """
+    Retorna vértices, normais e índices de uma esfera. As malhas ficam em
+    cache na memória (e, se cache_dir for informado, em arquivos .npz),
+    então pedidos repetidos com os mesmos parâmetros são imediatos. Os
+    arrays retornados são somente leitura, pois são compartilhados.
+    """
+    key = (float(radius), int(num_slices), int(num_stacks))
+    mesh = _sphere_cache.get(key)
+    if mesh is not None:
+        return mesh
+    
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "sphere_%r_%d_%d.npz" % key)
+        mesh = _load_sphere(path)
+    
+    if mesh is None:
+        mesh = _build_sphere(radius, num_slices, num_stacks)
+        if path is not None:
+            _store_sphere(path, mesh)
+    
+    for array in mesh:
+        array.flags.writeable = False
+    _sphere_cache[key] = mesh
+    return mesh
+
+def clear_sphere_cache():
+    """Descarta as malhas de esfera guardadas na memória"""
+    _sphere_cache.clear()
+
+def _opengl():
+    """
+    Módulo OpenGL.GL, importado só quando algo usa o GL: o modo headless
+    não depende do PyOpenGL nem das bibliotecas nativas de GL.
+    """
+    from OpenGL import GL
+    return GL
+
+def compile_shader(shader_code, shader_type, gl=None):
+    gl = gl or _opengl()
+    shader = gl.glCreateShader(shader_type)
+    gl.glShaderSource(shader, shader_code)
+    gl.glCompileShader(shader)
     
     # Verificar erros de compilação
-    success = glGetShaderiv(shader, GL_COMPILE_STATUS)
+    success = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
     if not success:
-        info_log = glGetShaderInfoLog(shader).decode('utf-8')
+        info_log = gl.glGetShaderInfoLog(shader).decode('utf-8')
         print(f"Erro ao compilar shader: {info_log}")
-        glDeleteShader(shader)
+        gl.glDeleteShader(shader)
         return 0
     
     return shader
 
-def create_shader_program(vertex_code, fragment_code):
-    vertex = compile_shader(vertex_code, GL_VERTEX_SHADER)
-    fragment = compile_shader(fragment_code, GL_FRAGMENT_SHADER)
+def create_shader_program(vertex_code, fragment_code, gl=None, retrievable=False):
+    gl = gl or _opengl()
+    vertex = compile_shader(vertex_code, gl.GL_VERTEX_SHADER, gl)
+    fragment = compile_shader(fragment_code, gl.GL_FRAGMENT_SHADER, gl)
     
-    program = glCreateProgram()
-    glAttachShader(program, vertex)
-    glAttachShader(program, fragment)
-    glLinkProgram(program)
+    program = gl.glCreateProgram()
+    gl.glAttachShader(program, vertex)
+    gl.glAttachShader(program, fragment)
+    if retrievable:
+        # Pede ao driver que guarde o binário para glGetProgramBinary
+        gl.glProgramParameteri(program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+    gl.glLinkProgram(program)
     
     # Verificar erros de ligação
-    success = glGetProgramiv(program, GL_LINK_STATUS)
+    success = gl.glGetProgramiv(program, gl.GL_LINK_STATUS)
     if not success:
-        info_log = glGetProgramInfoLog(program).decode('utf-8')
+        info_log = gl.glGetProgramInfoLog(program).decode('utf-8')
         print(f"Erro ao vincular programa: {info_log}")
+        gl.glDeleteProgram(program)
         return 0
     
     # Após a vinculação bem-sucedida, os shaders podem ser excluídos
-    glDeleteShader(vertex)
-    glDeleteShader(fragment)
+    gl.glDeleteShader(vertex)
+    gl.glDeleteShader(fragment)
     
     return program
 
-def main():
+class ProgramCache:
+    """
+    Cache em disco de programas de shader já vinculados, com
+    glGetProgramBinary / glProgramBinary. A chave é um hash do código dos
+    shaders e das strings do driver (fabricante, renderizador e versão),
+    então trocar de driver ou de GPU gera outra chave. Um binário ausente,
+    corrompido ou recusado pelo driver cai na compilação normal (e o
+    arquivo inválido é regravado).
+    
+    Args:
+        cache_dir: Diretório dos binários (um arquivo .bin por programa)
+    """
+    def __init__(self, cache_dir, gl=None):
+        self.cache_dir = cache_dir
+        gl = self.gl = gl or _opengl()
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+        self._driver = None
+    
+    def supported(self):
+        """Indica se o driver aceita binários de programa"""
+        gl = self.gl
+        try:
+            if not (bool(gl.glGetProgramBinary) and bool(gl.glProgramBinary)):
+                return False
+            return int(gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS)) > 0
+        except Exception:
+            return False
+    
+    def driver(self):
+        """Identificação do driver (consultada uma vez)"""
+        if self._driver is None:
+            parts = []
+            for name in (self.gl.GL_VENDOR, self.gl.GL_RENDERER, self.gl.GL_VERSION):
+                value = self.gl.glGetString(name) or b""
+                parts.append(value.decode('utf-8', 'replace') if isinstance(value, bytes) else str(value))
+            self._driver = " | ".join(parts)
+        return self._driver
+    
+    def key(self, vertex_code, fragment_code):
+        """Hash do código dos shaders e do driver"""
+        digest = hashlib.sha256()
+        for part in (self.driver(), vertex_code, fragment_code):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".bin")
+    
+    def _load_binary(self, path):
+        """Cria um programa a partir do arquivo; retorna 0 se for inválido"""
+        gl = self.gl
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return 0
+        if len(data) <= 4:
+            return 0
+        binary_format = struct.unpack('<I', data[:4])[0]
+        binary = np.frombuffer(data, dtype=np.uint8, offset=4)
+        
+        program = gl.glCreateProgram()
+        try:
+            gl.glProgramBinary(program, binary_format, binary, len(binary))
+            linked = gl.glGetProgramiv(program, gl.GL_LINK_STATUS)
+        except Exception:
+            linked = False
+        if not linked:
+            gl.glDeleteProgram(program)
+            return 0
+        return program
+    
+    def _store_binary(self, program, path):
+        """Grava o binário do programa (de forma atômica, por causa de processos concorrentes)"""
+        gl = self.gl
+        try:
+            length = int(gl.glGetProgramiv(program, gl.GL_PROGRAM_BINARY_LENGTH))
+            if length <= 0:
+                return
+            binary = np.zeros(length, dtype=np.uint8)
+            written = np.zeros(1, dtype=np.int32)
+            binary_format = np.zeros(1, dtype=np.uint32)
+            gl.glGetProgramBinary(program, length, written, binary_format, binary)
+        except Exception:
+            return
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary, 'wb') as file:
+            file.write(struct.pack('<I', int(binary_format[0])))
+            file.write(binary[:int(written[0])].tobytes())
+        os.replace(temporary, path)
+    
+    def create_program(self, vertex_code, fragment_code):
+        """
+        Retorna o programa vinculado: do binário em cache se possível,
+        senão compilando (e guardando o binário para a próxima vez).
+        """
+        if not self.supported():
+            self.misses += 1
+            return create_shader_program(vertex_code, fragment_code, self.gl)
+        
+        path = self.path(self.key(vertex_code, fragment_code))
+        if os.path.exists(path):
+            program = self._load_binary(path)
+            if program:
+                self.hits += 1
+                return program
+            # Binário recusado (driver atualizado, arquivo truncado...): descarta
+            self.invalid += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        
+        self.misses += 1
+        program = create_shader_program(vertex_code, fragment_code, self.gl, retrievable=True)
+        if program:
+            self._store_binary(program, path)
+        return program
+    
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalid': self.invalid}
+
+class ShaderProgram:
+    """
+    Envolve um programa de shader já vinculado: as localizações das
+    uniforms são obtidas uma única vez (na criação) e cada envio é
+    ignorado quando o valor não mudou desde o último envio. O ID do
+    programa é o retornado por create_shader_program.
+    """
+    def __init__(self, program, gl=None):
+        if not program:
+            # create_shader_program retorna 0 quando a compilação ou a vinculação falha
+            raise RuntimeError("Programa de shader inválido (0): a compilação ou a vinculação falhou")
+        self.program = program
+        gl = self.gl = gl or _opengl()
+        self.locations = {}
+        self._values = {}
+        self.uploads = 0
+        self.skipped = 0
+        
+        # Resolve as localizações de todas as uniforms ativas
+        for index in range(gl.glGetProgramiv(program, gl.GL_ACTIVE_UNIFORMS)):
+            name = gl.glGetActiveUniform(program, index)[0]
+            name = name.decode('utf-8') if isinstance(name, bytes) else name
+            name = name.split('[', 1)[0]
+            self.locations[name] = gl.glGetUniformLocation(program, name)
+    
+    def location(self, name):
+        """Localização da uniform (consultada ao GL só se ainda não estiver em cache)"""
+        location = self.locations.get(name)
+        if location is None:
+            location = self.gl.glGetUniformLocation(self.program, name)
+            self.locations[name] = location
+        return location
+    
+    def use(self):
+        self.gl.glUseProgram(self.program)
+    
+    def set_matrix4(self, name, matrix):
+        """Envia uma matriz 4x4 (linha a linha) se ela mudou"""
+        previous = self._values.get(name)
+        if previous is not None and np.array_equal(previous, matrix):
+            self.skipped += 1
+            return
+        if previous is None:
+            self._values[name] = np.array(matrix, dtype=np.float32)
+        else:
+            np.copyto(previous, matrix)
+        self.gl.glUniformMatrix4fv(self.location(name), 1, self.gl.GL_TRUE, self._values[name])
+        self.uploads += 1
+        instruments.count('uniform_uploads')
+    
+    def set_vec3(self, name, x, y, z):
+        """Envia um vec3 se ele mudou"""
+        if self._values.get(name) == (x, y, z):
+            self.skipped += 1
+            return
+        self._values[name] = (x, y, z)
+        self.gl.glUniform3f(self.location(name), x, y, z)
+        self.uploads += 1
+        instruments.count('uniform_uploads')
+    
+    def set_int(self, name, value):
+        """Envia um inteiro se ele mudou"""
+        if self._values.get(name) == value:
+            self.skipped += 1
+            return
+        self._values[name] = value
+        self.gl.glUniform1i(self.location(name), value)
+        self.uploads += 1
+        instruments.count('uniform_uploads')
+    
+    def delete(self):
+        self.gl.glDeleteProgram(self.program)
+        self._values.clear()
+
+# Floats por instância: matriz do modelo (16, por colunas) e cor (3)
+INSTANCE_FLOATS = 19
+
+def build_instance_data(positions, scales=1.0, colors=(0.5, 0.7, 0.9), rotations=None):
+    """
+    Monta o buffer de instâncias (K, 19) float32: para cada instância, a
+    matriz do modelo (translação * rotação * escala) em ordem de colunas,
+    como o GLSL lê um atributo mat4, seguida da cor RGB.
+    
+    Args:
+        positions: Posições (K, 3)
+        scales: Escala uniforme, escalar ou (K,)
+        colors: Cor RGB, (3,) ou (K, 3)
+        rotations: Matrizes de rotação (K, 3, 3) opcionais
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    count = len(positions)
+    scales = np.broadcast_to(np.asarray(scales, dtype=np.float32), (count,))
+    
+    linear = np.broadcast_to(np.identity(3, dtype=np.float32), (count, 3, 3)) if rotations is None \
+        else np.asarray(rotations, dtype=np.float32)
+    linear = linear * scales[:, None, None]
+    
+    data = np.zeros((count, INSTANCE_FLOATS), dtype=np.float32)
+    columns = data[:, :16].reshape(count, 4, 4)
+    # columns[:, c, r] = elemento (r, c) da matriz do modelo
+    columns[:, :3, :3] = linear.transpose(0, 2, 1)
+    columns[:, 3, :3] = positions
+    columns[:, 3, 3] = 1.0
+    data[:, 16:] = np.broadcast_to(np.asarray(colors, dtype=np.float32), (count, 3))
+    return data
+
+def cull_instances(positions, radii, view_projection):
+    """
+    Retorna a máscara das instâncias cuja esfera envolvente (centro, raio)
+    intersecta o frustum da câmera.
+    """
+    planes = frustum_planes(view_projection)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    distances = positions @ planes[:, :3].T + planes[:, 3]
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(positions),))
+    return np.all(distances >= -radii[:, None], axis=1)
+
+class InstancedMesh:
+    """
+    Malha desenhada com instâncias: um VBO para vértices e normais, um EBO
+    e um buffer de atributos por instância, todos num VAO, desenhados com
+    um único glDrawElementsInstanced.
+    """
+    def __init__(self, vertices, normals, indices, gl=None):
+        gl = self.gl = gl or _opengl()
+        self.index_count = len(indices)
+        self.instance_count = 0
+        self.capacity = 0
+        
+        self.vao = gl.glGenVertexArrays(1)
+        self.vbo_vertices, self.vbo_normals, self.ebo, self.vbo_instances = gl.glGenBuffers(4)
+        gl.glBindVertexArray(self.vao)
+        
+        for location, (vbo, data) in enumerate(((self.vbo_vertices, vertices), (self.vbo_normals, normals))):
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_STATIC_DRAW)
+            gl.glVertexAttribPointer(location, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+            gl.glEnableVertexAttribArray(location)
+        
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        
+        # Atributos por instância: 4 colunas da mat4 (locais 2-5) e a cor (6)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo_instances)
+        for location in range(2, 7):
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribDivisor(location, 1)
+        self._point_instances(0)
+        
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindVertexArray(0)
+    
+    def _point_instances(self, first):
+        """
+        Aponta os atributos por instância para o buffer a partir da instância
+        'first' (com o VAO e o buffer de instâncias já vinculados)
+        """
+        gl = self.gl
+        stride = INSTANCE_FLOATS * 4
+        base = first * stride
+        for column in range(4):
+            gl.glVertexAttribPointer(2 + column, 4, gl.GL_FLOAT, gl.GL_FALSE, stride,
+                                     ctypes.c_void_p(base + column * 16))
+        gl.glVertexAttribPointer(6, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(base + 64))
+    
+    def update(self, instance_data):
+        """Envia o buffer de instâncias (K, 19), realocando só quando ele cresce"""
+        gl = self.gl
+        instance_data = np.ascontiguousarray(instance_data, dtype=np.float32)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo_instances)
+        if len(instance_data) > self.capacity:
+            self.capacity = max(len(instance_data), 2 * self.capacity)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.capacity * INSTANCE_FLOATS * 4, None, gl.GL_DYNAMIC_DRAW)
+        if len(instance_data):
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, instance_data.nbytes, instance_data)
+            instruments.count('bytes_uploaded', instance_data.nbytes)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.instance_count = len(instance_data)
+    
+    def draw(self):
+        """Desenha todas as instâncias com uma única chamada"""
+        if not self.instance_count:
+            return
+        gl = self.gl
+        gl.glBindVertexArray(self.vao)
+        gl.glDrawElementsInstanced(gl.GL_TRIANGLES, self.index_count, gl.GL_UNSIGNED_INT, None,
+                                   self.instance_count)
+        instruments.count('draw_calls')
+        gl.glBindVertexArray(0)
+    
+    def delete(self):
+        self.gl.glDeleteVertexArrays(1, [self.vao])
+        self.gl.glDeleteBuffers(4, [self.vbo_vertices, self.vbo_normals, self.ebo, self.vbo_instances])
+
+# Fatias (e pilhas) de cada nível de detalhe da esfera, do mais simples ao mais detalhado
+LOD_LEVELS = (8, 16, 32, 64, 128)
+
+def create_sphere_lods(radius, levels=LOD_LEVELS):
+    """
+    Monta uma pirâmide de níveis de detalhe da esfera, com todas as malhas
+    em sequência nos mesmos arrays (para um único VBO/EBO). Os índices de
+    cada nível já incluem o deslocamento dos seus vértices.
+    
+    Retorna um dicionário com 'vertices', 'normals', 'indices', 'levels',
+    'index_offsets' e 'index_counts' (em índices, não em bytes).
+    """
+    vertices, normals, indices = [], [], []
+    index_offsets, index_counts = [], []
+    vertex_base = 0
+    index_base = 0
+    
+    for slices in levels:
+        level_vertices, level_normals, level_indices = create_sphere(radius, slices, slices)
+        vertices.append(level_vertices)
+        normals.append(level_normals)
+        indices.append(level_indices + np.uint32(vertex_base))
+        index_offsets.append(index_base)
+        index_counts.append(len(level_indices))
+        vertex_base += len(level_vertices) // 3
+        index_base += len(level_indices)
+    
+    return {
+        'vertices': np.concatenate(vertices),
+        'normals': np.concatenate(normals),
+        'indices': np.concatenate(indices),
+        'levels': np.array(levels),
+        'index_offsets': np.array(index_offsets),
+        'index_counts': np.array(index_counts),
+    }
+
+def select_lod(centers, radii, view, projection, viewport_height, levels=LOD_LEVELS, pixels_per_edge=8.0):
+    """
+    Escolhe o nível de detalhe de cada objeto pelo tamanho projetado na tela:
+    o raio em pixels é obtido com a matriz de perspectiva, e o nível é o
+    mais simples cujas arestas do contorno tenham no máximo
+    'pixels_per_edge' pixels. Retorna o índice do nível por objeto.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    view = np.asarray(view, dtype=np.float64)
+    depth = -(centers @ view[2, :3] + view[2, 3])
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(centers),))
+    
+    # Raio projetado em pixels (projection[1, 1] = 1 / tan(fovy / 2))
+    screen_radius = radii * projection[1, 1] / np.maximum(depth, 1e-6) * (viewport_height / 2.0)
+    wanted_slices = 2.0 * math.pi * screen_radius / pixels_per_edge
+    return np.minimum(np.searchsorted(np.asarray(levels), wanted_slices), len(levels) - 1)
+
+class LODInstancedMesh(InstancedMesh):
+    """
+    Malha instanciada com níveis de detalhe: os níveis ficam em sequência
+    nos mesmos buffers e as instâncias, ordenadas por nível, são desenhadas
+    com uma chamada glDrawElementsInstanced por nível.
+    """
+    def __init__(self, lods, gl=None):
+        super().__init__(lods['vertices'], lods['normals'], lods['indices'], gl)
+        self.lods = lods
+        self.level_counts = np.zeros(len(lods['levels']), dtype=np.int64)
+    
+    def update_levels(self, instance_data, levels):
+        """Ordena as instâncias por nível e envia o buffer"""
+        order = np.argsort(levels, kind='stable')
+        self.level_counts = np.bincount(levels, minlength=len(self.lods['levels']))
+        self.update(instance_data[order])
+    
+    def draw(self):
+        """Desenha cada nível com suas instâncias"""
+        if not self.instance_count:
+            return
+        gl = self.gl
+        gl.glBindVertexArray(self.vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo_instances)
+        first = 0
+        for level, count in enumerate(self.level_counts.tolist()):
+            if count:
+                self._point_instances(first)
+                gl.glDrawElementsInstanced(gl.GL_TRIANGLES, int(self.lods['index_counts'][level]),
+                                           gl.GL_UNSIGNED_INT,
+                                           ctypes.c_void_p(int(self.lods['index_offsets'][level]) * 4), count)
+                instruments.count('draw_calls')
+                first += count
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindVertexArray(0)
+
+def tree_instances(depth, length=1.0):
+    """
+    Posições e escalas dos nós (fins dos galhos) da árvore de
+    n1Turtle3D.draw_tree, para visualizar com instâncias.
+    """
+    from n1Turtle3D import Turtle3D, draw_tree_vectorized
+    
+    turtle = Turtle3D()
+    turtle.rotate_z(90)  # Crescer para cima (eixo Y)
+    draw_tree_vectorized(turtle, length, depth)
+    segments = turtle.segments
+    positions = segments[:, 1]
+    scales = 0.15 * np.linalg.norm(segments[:, 1] - segments[:, 0], axis=1)
+    return positions, scales
+
+def parse_args(argv=None):
+    """Lê as opções do visualizador da linha de comando"""
+    parser = argparse.ArgumentParser(description="Visualizador 3D de esferas.")
+    parser.add_argument('--instances', type=int, default=0,
+                        help="Desenha N esferas aleatórias com renderização instanciada")
+    parser.add_argument('--tree', type=int, default=0,
+                        help="Desenha os nós da árvore de draw_tree com a profundidade dada (instanciado)")
+    parser.add_argument('--seed', type=int, default=0, help="Semente das posições aleatórias")
+    parser.add_argument('--headless', action='store_true',
+                        help="Renderiza sem janela, com o rasterizador em NumPy (n1Raster)")
+    parser.add_argument('--frames', type=int, default=60, help="Número de quadros no modo headless")
+    parser.add_argument('--output', default="frame_%04d.png",
+                        help="Padrão dos arquivos de saída (.png ou .ppm), ou '-' para um fluxo "
+                             "RGB24 bruto na saída padrão (ex.: para o ffmpeg)")
+    parser.add_argument('--width', type=int, default=800, help="Largura dos quadros")
+    parser.add_argument('--height', type=int, default=600, help="Altura dos quadros")
+    parser.add_argument('--camera-distance', type=float, default=5.0,
+                        help="Distância da câmera no modo headless (0: view identidade, como na janela)")
+    parser.add_argument('--render-mode', type=int, default=0, choices=[0, 1, 2],
+                        help="Modo no headless (como as teclas 1/2/3): 0 preenchido, 1 pontos, 2 wireframe")
+    parser.add_argument('--shader-cache', default=os.path.join(os.path.expanduser("~"), ".cache", "n1Objeto3D"),
+                        help="Diretório do cache de binários de shader ('' desativa)")
+    parser.add_argument('--stats', action='store_true',
+                        help="Mede cada quadro (percentis p50/p95/p99 no título da janela)")
+    parser.add_argument('--stats-jsonl', help="Também exporta as medidas de cada quadro neste arquivo JSON lines")
+    args = parser.parse_args(argv)
+    if args.headless and args.output != '-':
+        # O padrão recebe o número do quadro: precisa de exatamente um campo %d
+        try:
+            args.output % 0
+        except (TypeError, ValueError):
+            parser.error(f"--output precisa de um campo para o número do quadro, "
+                         f"como frame_%04d.png (recebido {args.output!r})")
+    return args
+
+def render_headless(args):
+    """
+    Renderiza os quadros da animação de rotação sem janela nem contexto GL,
+    com o rasterizador em NumPy, e salva cada quadro (ou escreve um fluxo
+    RGB24 bruto na saída padrão). Reporta os quadros por segundo.
+    """
+    sphere_vertices, sphere_normals, sphere_indices = create_sphere(1.0, 32, 32)
+    model = np.identity(4, dtype=np.float32)
+    view = translation_matrix(0.0, 0.0, -args.camera_distance)
+    projection = perspective(45.0, args.width / args.height, 0.1, 100.0)
+    stream = sys.stdout.buffer if args.output == '-' else None
+    
+    rotation_x = 0
+    rotation_y = 0
+    start = time.perf_counter()
+    
+    for frame in range(args.frames):
+        # Mesma animação do loop principal
+        rotation_x += 0.5
+        rotation_y += 0.3
+        model_matrix(math.radians(rotation_x), math.radians(rotation_y), out=model)
+        
+        with instruments.timer('render'):
+            image = render_mesh(sphere_vertices, sphere_normals, sphere_indices, model, view, projection,
+                                args.width, args.height, render_mode=args.render_mode)
+        if stream is not None:
+            stream.write(image.tobytes())
+        elif args.output.lower().endswith('.ppm'):
+            write_ppm(args.output % frame, image)
+        else:
+            write_png(args.output % frame, image)
+        instruments.end_frame()
+    
+    elapsed = time.perf_counter() - start
+    print(f"{args.frames} quadros em {elapsed:.2f} s ({args.frames / elapsed:.1f} quadros/s)", file=sys.stderr)
+    if instruments.enabled:
+        print(instruments.format_line('render'), file=sys.stderr)
+        instruments.close()
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    if args.stats or args.stats_jsonl:
+        instruments.enable(args.stats_jsonl)
+    
+    # O modo headless é despachado antes de qualquer import de pygame ou OpenGL
+    if args.headless:
+        render_headless(args)
+        return
+    run_window(args)
+
+def run_window(args):
+    """Abre a janela do pygame e desenha a esfera (ou as instâncias) com OpenGL"""
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    from OpenGL import GL as gl
+    from OpenGL import GLU as glu
+    
     pygame.init()
     display = (800, 600)
-    pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
-    pygame.display.set_caption("Visualizador 3D - Alternar com teclas 1 (normal), 2 (pontos), 3 (wireframe)")
+    pygame.display.set_mode(display, pygame.DOUBLEBUF | pygame.OPENGL)
+    caption = "Visualizador 3D - Alternar com teclas 1 (normal), 2 (pontos), 3 (wireframe)"
+    pygame.display.set_caption(caption)
     
     # Configuração do OpenGL
-    glEnable(GL_DEPTH_TEST)
-    glClearColor(0.1, 0.1, 0.1, 1.0)
+    gl.glEnable(gl.GL_DEPTH_TEST)
+    gl.glClearColor(0.1, 0.1, 0.1, 1.0)
     
     # Perspectiva
-    gluPerspective(45, (display[0] / display[1]), 0.1, 50.0)
-    glTranslatef(0.0, 0.0, -5)
+    glu.gluPerspective(45, (display[0] / display[1]), 0.1, 50.0)
+    gl.glTranslatef(0.0, 0.0, -5)
     
     # Criar os dados da esfera
     sphere_vertices, sphere_normals, sphere_indices = create_sphere(1.0, 32, 32)
     
     # Criar e configurar o VAO e VBOs
-    VAO = glGenVertexArrays(1)
-    VBO_vertices = glGenBuffers(1)
-    VBO_normals = glGenBuffers(1)
-    EBO = glGenBuffers(1)
+    VAO = gl.glGenVertexArrays(1)
+    VBO_vertices = gl.glGenBuffers(1)
+    VBO_normals = gl.glGenBuffers(1)
+    EBO = gl.glGenBuffers(1)
     
-    glBindVertexArray(VAO)
+    gl.glBindVertexArray(VAO)
     
     # Carregar vértices
-    glBindBuffer(GL_ARRAY_BUFFER, VBO_vertices)
-    glBufferData(GL_ARRAY_BUFFER, sphere_vertices.nbytes, sphere_vertices, GL_STATIC_DRAW)
-    glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
-    glEnableVertexAttribArray(0)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, VBO_vertices)
+    gl.glBufferData(gl.GL_ARRAY_BUFFER, sphere_vertices.nbytes, sphere_vertices, gl.GL_STATIC_DRAW)
+    gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+    gl.glEnableVertexAttribArray(0)
     
     # Carregar normais
-    glBindBuffer(GL_ARRAY_BUFFER, VBO_normals)
-    glBufferData(GL_ARRAY_BUFFER, sphere_normals.nbytes, sphere_normals, GL_STATIC_DRAW)
-    glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, None)
-    glEnableVertexAttribArray(1)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, VBO_normals)
+    gl.glBufferData(gl.GL_ARRAY_BUFFER, sphere_normals.nbytes, sphere_normals, gl.GL_STATIC_DRAW)
+    gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+    gl.glEnableVertexAttribArray(1)
     
     # Carregar índices
-    glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
-    glBufferData(GL_ELEMENT_ARRAY_BUFFER, sphere_indices.nbytes, sphere_indices, GL_STATIC_DRAW)
+    gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, EBO)
+    gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, sphere_indices.nbytes, sphere_indices, gl.GL_STATIC_DRAW)
     
-    glBindBuffer(GL_ARRAY_BUFFER, 0)
-    glBindVertexArray(0)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+    gl.glBindVertexArray(0)
     
     # Compilar e configurar o programa de shader
-    shader_program = create_shader_program(vertex_shader, fragment_shader)
+    program_cache = ProgramCache(args.shader_cache) if args.shader_cache else None
+    if program_cache is not None:
+        shader_program = program_cache.create_program(vertex_shader, fragment_shader)
+    else:
+        shader_program = create_shader_program(vertex_shader, fragment_shader)
+    program = ShaderProgram(shader_program)
+    
+    # Matrizes do quadro: o modelo é reescrito a cada quadro no mesmo buffer
+    model = np.identity(4, dtype=np.float32)
+    view = np.identity(4, dtype=np.float32)
+    projection = perspective(45.0, display[0]/display[1], 0.1, 100.0)
+    
+    # Modo instanciado: muitas esferas com uma única chamada de desenho
+    instanced = None
+    if args.tree or args.instances:
+        if args.tree:
+            centers, scales = tree_instances(args.tree)
+        else:
+            rng = np.random.default_rng(args.seed)
+            centers = rng.uniform(-1.0, 1.0, (args.instances, 3))
+            scales = np.full(args.instances, 0.5 / max(args.instances, 1) ** (1.0 / 3.0))
+        centers = centers - (centers.max(axis=0) + centers.min(axis=0)) / 2.0
+        colors = 0.4 + 0.6 * (centers - centers.min(axis=0)) / np.maximum(np.ptp(centers, axis=0), 1e-6)
+        instance_data = build_instance_data(centers, scales, colors)
+        instanced = LODInstancedMesh(create_sphere_lods(1.0))
+        if program_cache is not None:
+            instanced_program = ShaderProgram(program_cache.create_program(instanced_vertex_shader,
+                                                                           instanced_fragment_shader))
+        else:
+            instanced_program = ShaderProgram(create_shader_program(instanced_vertex_shader,
+                                                                    instanced_fragment_shader))
+        
+        # Câmera afastada o suficiente para enquadrar todas as instâncias
+        camera_distance = 2.5 * float(np.max(np.linalg.norm(centers, axis=1) + scales)) + 1.0
+        camera = translation_matrix(0.0, 0.0, -camera_distance)
+        instanced_view = np.identity(4, dtype=np.float32)
+        view_projection = np.identity(4, dtype=np.float32)
+        projection = perspective(45.0, display[0]/display[1], 0.1, 4.0 * camera_distance)
+        print(f"Modo instanciado: {len(instance_data)} esferas")
+    
+    if program_cache is not None:
+        stats = program_cache.stats()
+        print(f"Cache de shaders: {stats['hits']} acertos, {stats['misses']} faltas, "
+              f"{stats['invalid']} inválidos")
+    
+    # Tempo de CPU por quadro (média exibida no título da janela)
+    cpu_time = 0.0
+    frame_count = 0
     
     # Variáveis de rotação para animação básica
     rotation_x = 0
@@ -208,6 +857,7 @@ def main():
     # Loop principal
     running = True
     while running:
+        frame_start = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
@@ -225,72 +875,103 @@ def main():
                     running = False
         
         # Limpar a tela
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
         # Atualizar a rotação para uma animação básica
         rotation_x += 0.5
         rotation_y += 0.3
         
-        # Usar o programa de shader
-        glUseProgram(shader_program)
-        
-        # Configurar as matrizes de transformação
-        model = np.identity(4, dtype=np.float32)
-        model = np.dot(model, rotation_matrix_x(math.radians(rotation_x)))
-        model = np.dot(model, rotation_matrix_y(math.radians(rotation_y)))
-        
-        view = np.identity(4, dtype=np.float32)
-        projection = perspective(45.0, display[0]/display[1], 0.1, 100.0)
-        
-        # Obter localização das uniforms
-        model_loc = glGetUniformLocation(shader_program, "model")
-        view_loc = glGetUniformLocation(shader_program, "view")
-        projection_loc = glGetUniformLocation(shader_program, "projection")
-        light_pos_loc = glGetUniformLocation(shader_program, "lightPos")
-        view_pos_loc = glGetUniformLocation(shader_program, "viewPos")
-        light_color_loc = glGetUniformLocation(shader_program, "lightColor")
-        object_color_loc = glGetUniformLocation(shader_program, "objectColor")
-        render_mode_loc = glGetUniformLocation(shader_program, "renderMode")
-        
-        # Definir valores das uniforms
-        glUniformMatrix4fv(model_loc, 1, GL_TRUE, model)
-        glUniformMatrix4fv(view_loc, 1, GL_TRUE, view)
-        glUniformMatrix4fv(projection_loc, 1, GL_TRUE, projection)
-        glUniform3f(light_pos_loc, 3.0, 3.0, 5.0)
-        glUniform3f(view_pos_loc, 0.0, 0.0, 5.0)
-        glUniform3f(light_color_loc, 1.0, 1.0, 1.0)
-        glUniform3f(object_color_loc, 0.5, 0.7, 0.9)
-        glUniform1i(render_mode_loc, render_mode)
-        
-        # Desenhar a esfera com o modo de renderização apropriado
-        glBindVertexArray(VAO)
+        # Configurar as matrizes de transformação (a matriz do modelo é
+        # escrita no buffer pré-alocado; view e projection são constantes)
+        model_matrix(math.radians(rotation_x), math.radians(rotation_y), out=model)
         
+        # Modo de renderização apropriado
         if render_mode == 1:  # Modo de pontos
-            glPolygonMode(GL_FRONT_AND_BACK, GL_POINT)
-            glPointSize(3.0)
+            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_POINT)
+            gl.glPointSize(3.0)
         elif render_mode == 2:  # Modo wireframe
-            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-            glLineWidth(1.0)
+            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
+            gl.glLineWidth(1.0)
         else:  # Modo normal (preenchido)
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
         
-        # Desenhar usando o Element Buffer Object
-        glDrawElements(GL_TRIANGLES, len(sphere_indices), GL_UNSIGNED_INT, None)
+        if instanced is not None:
+            # A rotação da animação gira a cena inteira (entra na view)
+            np.dot(camera, model, out=instanced_view)
+            np.dot(projection, instanced_view, out=view_projection)
+            
+            # Só as instâncias dentro do frustum são enviadas e desenhadas
+            visible = cull_instances(centers, scales, view_projection)
+            
+            # Nível de detalhe de cada instância visível pelo tamanho na tela
+            levels = select_lod(centers[visible], scales[visible], instanced_view, projection, display[1])
+            instanced.update_levels(instance_data[visible], levels)
+            
+            instanced_program.use()
+            instanced_program.set_matrix4("view", instanced_view)
+            instanced_program.set_matrix4("projection", projection)
+            instanced_program.set_vec3("lightPos", 3.0, 3.0, camera_distance)
+            instanced_program.set_vec3("viewPos", 0.0, 0.0, camera_distance)
+            instanced_program.set_vec3("lightColor", 1.0, 1.0, 1.0)
+            instanced_program.set_int("renderMode", render_mode)
+            instanced.draw()
+        else:
+            # Usar o programa de shader
+            program.use()
+            
+            # Definir valores das uniforms (só as que mudaram são enviadas)
+            program.set_matrix4("model", model)
+            program.set_matrix4("view", view)
+            program.set_matrix4("projection", projection)
+            program.set_vec3("lightPos", 3.0, 3.0, 5.0)
+            program.set_vec3("viewPos", 0.0, 0.0, 5.0)
+            program.set_vec3("lightColor", 1.0, 1.0, 1.0)
+            program.set_vec3("objectColor", 0.5, 0.7, 0.9)
+            program.set_int("renderMode", render_mode)
+            
+            gl.glBindVertexArray(VAO)
+            
+            # Desenhar usando o Element Buffer Object
+            gl.glDrawElements(gl.GL_TRIANGLES, len(sphere_indices), gl.GL_UNSIGNED_INT, None)
+            instruments.count('draw_calls')
         
         # Restaurar o estado do OpenGL
-        glBindVertexArray(0)
-        glUseProgram(0)
+        gl.glBindVertexArray(0)
+        gl.glUseProgram(0)
+        
+        # Medir o tempo de CPU do quadro (sem a troca de buffers e a espera)
+        frame_cpu = time.perf_counter() - frame_start
+        instruments.record('cpu', frame_cpu)
+        cpu_time += frame_cpu
+        frame_count += 1
+        if frame_count == 60:
+            title = f"{caption} | CPU: {cpu_time / frame_count * 1000.0:.2f} ms/quadro"
+            if instruments.enabled:
+                title += f" | {instruments.format_line('cpu')}"
+            pygame.display.set_caption(title)
+            cpu_time = 0.0
+            frame_count = 0
         
         # Atualizar a tela
-        pygame.display.flip()
+        with instruments.timer('swap'):
+            pygame.display.flip()
         clock.tick(60)
+        instruments.end_frame()
     
     # Limpar recursos do OpenGL
-    glDeleteVertexArrays(1, [VAO])
-    glDeleteBuffers(1, [VBO_vertices])
-    glDeleteBuffers(1, [VBO_normals])
-    glDeleteBuffers(1, [EBO])
-    glDeleteProgram(shader_program)
+    gl.glDeleteVertexArrays(1, [VAO])
+    gl.glDeleteBuffers(1, [VBO_vertices])
+    gl.glDeleteBuffers(1, [VBO_normals])
+    gl.glDeleteBuffers(1, [EBO])
+    program.delete()
+    if instanced is not None:
+        instanced.delete()
+        instanced_program.delete()
+    
+    if instruments.enabled:
+        print(instruments.format_line('cpu'))
+        print(instruments.format_line('frame'))
+        instruments.close()
     
     pygame.quit()
     sys.exit()
@@ -313,6 +994,26 @@ def rotation_matrix_y(angle):
         [0.0, 0.0, 0.0, 1.0]
     ], dtype=np.float32)
 
+def translation_matrix(x, y, z):
+    """Retorna uma matriz de translação."""
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[0, 3], matrix[1, 3], matrix[2, 3] = x, y, z
+    return matrix
+
+def model_matrix(angle_x, angle_y, out=None):
+    """
+    Retorna rotation_matrix_x(angle_x) @ rotation_matrix_y(angle_y) em forma
+    fechada, escrevendo no array 'out' (4x4 float32) se ele for informado.
+    """
+    if out is None:
+        out = np.identity(4, dtype=np.float32)
+    cx, sx = math.cos(angle_x), math.sin(angle_x)
+    cy, sy = math.cos(angle_y), math.sin(angle_y)
+    out[0, 0], out[0, 1], out[0, 2] = cy, 0.0, sy
+    out[1, 0], out[1, 1], out[1, 2] = sx * sy, cx, -sx * cy
+    out[2, 0], out[2, 1], out[2, 2] = -cx * sy, sx, cx * cy
+    return out
+
 def perspective(fovy, aspect, near, far):
     """Cria uma matriz de projeção perspectiva."""
     f = 1.0 / math.tan(math.radians(fovy) / 2.0)
@@ -0,0 +1,441 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+
+from n1Geometria import write_segments
+
+
+def fit_segments(segments, width, height, margin=10):
+    """
+    Converte segmentos 2D (N, 2, 2) para coordenadas de pixel, centralizando
+    o desenho e preservando a proporção. O eixo Y é invertido (na imagem,
+    Y cresce para baixo).
+    """
+    points = segments.reshape(-1, 2).astype(np.float64)
+    mins = points.min(axis=0)
+    maxs = points.max(axis=0)
+    center = (mins + maxs) / 2.0
+    span = np.maximum(maxs - mins, 1e-9)
+    scale = min((width - 2 * margin) / span[0], (height - 2 * margin) / span[1])
+
+    pixels = (segments.astype(np.float64) - center) * scale
+    pixels[..., 0] += width / 2.0
+    pixels[..., 1] = height / 2.0 - pixels[..., 1]
+    return pixels
+
+
+def rasterize_segments(segments, width=800, height=800, color=(0, 255, 0),
+                       background=(0, 0, 0), margin=10, batch_size=65536):
+    """
+    Rasteriza os segmentos (N, 2, 2) em um buffer de imagem (altura,
+    largura, 3) uint8, sem janela. As linhas são amostradas em lotes
+    vetorizados, com uma amostra por pixel ao longo do maior eixo (DDA).
+    """
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = background
+    if len(segments) == 0:
+        return image
+
+    pixels = fit_segments(segments, width, height, margin)
+
+    for first in range(0, len(pixels), batch_size):
+        batch = pixels[first:first + batch_size]
+        start = batch[:, 0]
+        delta = batch[:, 1] - start
+
+        # Número de amostras de cada segmento
+        counts = np.ceil(np.abs(delta).max(axis=1)).astype(np.int64) + 1
+        owner = np.repeat(np.arange(len(batch)), counts)
+        offsets = np.cumsum(counts) - counts
+        t = (np.arange(counts.sum()) - offsets[owner]) / np.maximum(counts - 1, 1)[owner]
+
+        samples = start[owner] + delta[owner] * t[:, None]
+        x = np.rint(samples[:, 0]).astype(np.int64)
+        y = np.rint(samples[:, 1]).astype(np.int64)
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        image[y[inside], x[inside]] = color
+
+    return image
+
+
+def write_ppm(path, image):
+    """Salva a imagem (altura, largura, 3) uint8 no formato PPM binário"""
+    height, width = image.shape[:2]
+    with open(path, 'wb') as file:
+        file.write(b"P6\n%d %d\n255\n" % (width, height))
+        file.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+
+
+def _png_chunk(tag, data):
+    """Monta um bloco PNG (tamanho, tipo, dados, CRC)"""
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+
+def write_png(path, image, compression=6):
+    """Salva a imagem (altura, largura, 3) uint8 no formato PNG (RGB de 8 bits)"""
+    height, width = image.shape[:2]
+
+    # Cada linha começa com o byte de filtro 0 (nenhum)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    with open(path, 'wb') as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(_png_chunk(b"IHDR", struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        file.write(_png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)))
+        file.write(_png_chunk(b"IEND", b""))
+
+
+def write_svg(path, segments, width=800, height=800, color=(0, 255, 0),
+              background=(0, 0, 0), margin=10):
+    """Salva os segmentos como um único caminho SVG, no mesmo enquadramento da imagem"""
+    stroke = "#%02x%02x%02x" % tuple(color)
+    fill = "#%02x%02x%02x" % tuple(background)
+
+    with open(path, 'w') as file:
+        file.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                   f'viewBox="0 0 {width} {height}">\n')
+        file.write(f'<rect width="100%" height="100%" fill="{fill}"/>\n')
+        if len(segments):
+            pixels = fit_segments(segments, width, height, margin).reshape(-1, 4)
+            commands = "".join("M%.2f %.2fL%.2f %.2f" % tuple(row) for row in pixels.tolist())
+            file.write(f'<path d="{commands}" stroke="{stroke}" fill="none" stroke-width="1"/>\n')
+        file.write('</svg>\n')
+
+
+# Extensões aceitas por export_segments
+EXPORT_FORMATS = ('png', 'ppm', 'pnm', 'svg', 'n1g')
+
+
+def export_format(path):
+    """Extensão (em minúsculas) do arquivo, se export_segments a suportar, senão None"""
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    return extension if extension in EXPORT_FORMATS else None
+
+
+def export_segments(path, segments, width=800, height=800, color=(0, 255, 0),
+                    background=(0, 0, 0), margin=10):
+    """
+    Exporta os segmentos para PNG, PPM ou SVG, conforme a extensão do
+    arquivo, ou para o formato binário de geometria (.n1g) de n1Geometria
+    """
+    extension = export_format(path)
+    if extension is None:
+        raise ValueError(f"Formato de imagem não suportado: {path}")
+
+    if extension == 'n1g':
+        write_segments(path, segments)
+        return
+    if extension == 'svg':
+        write_svg(path, segments, width, height, color, background, margin)
+        return
+
+    image = rasterize_segments(segments, width, height, color, background, margin)
+    if extension == 'png':
+        write_png(path, image)
+    else:
+        write_ppm(path, image)
+
+
+def _phong(positions, normals, light_pos, view_pos, light_color, object_color):
+    """
+    Iluminação de Phong por pixel, com os mesmos termos do fragment_shader de
+    n1Objeto3D (ambiente 0.1, difusa, especular 0.5 com expoente 32).
+    """
+    light_color = np.asarray(light_color, dtype=np.float64)
+    norm = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    light_dir = np.asarray(light_pos) - positions
+    light_dir /= np.linalg.norm(light_dir, axis=1, keepdims=True)
+
+    diff = np.maximum(np.einsum('ij,ij->i', norm, light_dir), 0.0)
+    diffuse = diff[:, None] * light_color
+    ambient = 0.1 * light_color
+
+    view_dir = np.asarray(view_pos) - positions
+    view_dir /= np.linalg.norm(view_dir, axis=1, keepdims=True)
+    # reflect(-L, N) = -L + 2 dot(N, L) N
+    reflect_dir = -light_dir + 2.0 * np.einsum('ij,ij->i', norm, light_dir)[:, None] * norm
+    spec = np.maximum(np.einsum('ij,ij->i', view_dir, reflect_dir), 0.0) ** 32
+    specular = 0.5 * spec[:, None] * light_color
+
+    return (ambient + diffuse + specular) * np.asarray(object_color)
+
+
+def _clip_near(triangles, clip, world, normals):
+    """
+    Recorta os triângulos pelo plano próximo (z + w >= 0, em coordenadas de
+    recorte), como o GL: triângulos com um vértice dentro viram um
+    triângulo, com dois viram dois. Os vértices novos são interpolados
+    linearmente (posição de recorte, posição no mundo e normal).
+    """
+    distance = clip[:, 2] + clip[:, 3]
+    inside = distance[triangles] >= 0
+    count = inside.sum(axis=1)
+
+    kept = [triangles[count == 3]]
+    extra_clip, extra_world, extra_normals = [], [], []
+    next_index = len(clip)
+
+    for inside_count in (1, 2):
+        selected = triangles[count == inside_count]
+        if len(selected) == 0:
+            continue
+        # Gira os vértices para que o vértice "diferente" fique na posição 0
+        flags = inside[count == inside_count]
+        special = np.argmax(flags, axis=1) if inside_count == 1 else np.argmin(flags, axis=1)
+        rotated = np.take_along_axis(selected, (special[:, None] + np.arange(3)) % 3, axis=1)
+        a, b, c = rotated[:, 0], rotated[:, 1], rotated[:, 2]
+
+        # Interseções das arestas a-b e a-c com o plano
+        new_vertices = []
+        for other in (b, c):
+            t = (distance[a] / (distance[a] - distance[other]))[:, None]
+            extra_clip.append(clip[a] + t * (clip[other] - clip[a]))
+            extra_world.append(world[a] + t * (world[other] - world[a]))
+            extra_normals.append(normals[a] + t * (normals[other] - normals[a]))
+            new_vertices.append(next_index + np.arange(len(a)))
+            next_index += len(a)
+        ab, ac = new_vertices
+
+        if inside_count == 1:
+            kept.append(np.stack([a, ab, ac], axis=1))
+        else:
+            kept.append(np.stack([ab, b, c], axis=1))
+            kept.append(np.stack([ab, c, ac], axis=1))
+
+    if extra_clip:
+        clip = np.concatenate([clip] + extra_clip)
+        world = np.concatenate([world] + extra_world)
+        normals = np.concatenate([normals] + extra_normals)
+    return np.concatenate(kept), clip, world, normals
+
+
+def _nearest_fragments(pixel, z, zbuffer):
+    """
+    Teste de profundidade (GL_LESS) de uma lista de fragmentos: retorna os
+    índices dos fragmentos que vencem (o mais próximo de cada pixel, se mais
+    próximo que o z-buffer) e atualiza o z-buffer.
+    """
+    valid = np.flatnonzero((z >= 0.0) & (z <= 1.0))
+    if len(valid) == 0:
+        return valid
+    order = valid[np.lexsort((z[valid], pixel[valid]))]
+    sorted_pixels = pixel[order]
+    nearest = order[np.r_[True, sorted_pixels[1:] != sorted_pixels[:-1]]]
+    nearest = nearest[z[nearest] < zbuffer[pixel[nearest]]]
+    zbuffer[pixel[nearest]] = z[nearest]
+    return nearest
+
+
+def _raster_triangles(triangles, screen_x, screen_y, depth, width, height, zbuffer, tile_size, chunk_size):
+    """
+    Rasteriza os triângulos em blocos (tiles) de tile_size x tile_size pixels.
+    Cada triângulo é associado aos blocos que sua caixa envolvente toca; em
+    cada bloco, a lista de fragmentos (pixels do bloco dentro da caixa) é
+    testada com funções de aresta e resolvida pelo z-buffer. Retorna, por
+    pixel, o triângulo vencedor (-1 se nenhum) e suas coordenadas baricêntricas.
+    """
+    winner = np.full(width * height, -1, dtype=np.int64)
+    weights = np.zeros((width * height, 3))
+    if len(triangles) == 0:
+        return winner, weights
+
+    x = screen_x[triangles]
+    y = screen_y[triangles]
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+
+    # Caixa envolvente: pixels cujo centro pode estar no triângulo
+    x0 = np.clip(np.ceil(x.min(axis=1) - 0.5), 0, width).astype(np.int64)
+    x1 = np.clip(np.floor(x.max(axis=1) - 0.5) + 1, 0, width).astype(np.int64)
+    y0 = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, height).astype(np.int64)
+    y1 = np.clip(np.floor(y.max(axis=1) - 0.5) + 1, 0, height).astype(np.int64)
+    valid = np.flatnonzero((x1 > x0) & (y1 > y0) & (np.abs(area) > 1e-12))
+
+    # Pares (triângulo, bloco) para todos os blocos tocados por cada caixa
+    tx0, tx1 = x0[valid] // tile_size, (x1[valid] - 1) // tile_size + 1
+    ty0, ty1 = y0[valid] // tile_size, (y1[valid] - 1) // tile_size + 1
+    tile_columns = tx1 - tx0
+    tile_counts = tile_columns * (ty1 - ty0)
+    pair_owner = np.repeat(np.arange(len(valid)), tile_counts)
+    local = np.arange(len(pair_owner)) - np.repeat(np.cumsum(tile_counts) - tile_counts, tile_counts)
+    tiles_per_row = (width + tile_size - 1) // tile_size
+    pair_tile = ((ty0[pair_owner] + local // tile_columns[pair_owner]) * tiles_per_row
+                 + tx0[pair_owner] + local % tile_columns[pair_owner])
+    order = np.argsort(pair_tile, kind='stable')
+    pair_tile, pair_triangle = pair_tile[order], valid[pair_owner[order]]
+    tile_starts = np.flatnonzero(np.r_[True, pair_tile[1:] != pair_tile[:-1]])
+    tile_ends = np.r_[tile_starts[1:], len(pair_tile)]
+
+    for tile_start, tile_end in zip(tile_starts.tolist(), tile_ends.tolist()):
+        tile = int(pair_tile[tile_start])
+        left = (tile % tiles_per_row) * tile_size
+        top = (tile // tiles_per_row) * tile_size
+
+        for first in range(tile_start, tile_end, chunk_size):
+            ids = pair_triangle[first:min(first + chunk_size, tile_end)]
+
+            # Caixa de cada triângulo limitada ao bloco
+            bx0 = np.maximum(x0[ids], left)
+            bx1 = np.minimum(x1[ids], left + tile_size)
+            by0 = np.maximum(y0[ids], top)
+            by1 = np.minimum(y1[ids], top + tile_size)
+            columns = bx1 - bx0
+            boxes = columns * (by1 - by0)
+
+            # Lista de fragmentos: um por (triângulo, pixel da caixa no bloco)
+            owner = np.repeat(np.arange(len(ids)), boxes)
+            offset = np.arange(len(owner)) - np.repeat(np.cumsum(boxes) - boxes, boxes)
+            px = bx0[owner] + offset % columns[owner]
+            py = by0[owner] + offset // columns[owner]
+            cx = px + 0.5
+            cy = py + 0.5
+
+            # Coordenadas baricêntricas (funções de aresta divididas pela área,
+            # o que aceita as duas orientações: não há descarte de faces)
+            triangle = ids[owner]
+            xs = x[triangle]
+            ys = y[triangle]
+            inv_area = 1.0 / area[triangle]
+            l0 = ((xs[:, 1] - cx) * (ys[:, 2] - cy) - (xs[:, 2] - cx) * (ys[:, 1] - cy)) * inv_area
+            l1 = ((xs[:, 2] - cx) * (ys[:, 0] - cy) - (xs[:, 0] - cx) * (ys[:, 2] - cy)) * inv_area
+            l2 = 1.0 - l0 - l1
+            inside = (l0 >= 0) & (l1 >= 0) & (l2 >= 0)
+
+            triangle = triangle[inside]
+            bary = np.c_[l0[inside], l1[inside], l2[inside]]
+            pixel = (py * width + px)[inside]
+            z = np.einsum('ij,ij->i', bary, depth[triangles[triangle]])
+
+            nearest = _nearest_fragments(pixel, z, zbuffer)
+            winner[pixel[nearest]] = triangle[nearest]
+            weights[pixel[nearest]] = bary[nearest]
+
+    return winner, weights
+
+
+def _raster_points(points, screen_x, screen_y, depth, width, height, zbuffer, point_size):
+    """
+    Desenha os vértices como quadrados de point_size pixels (GL_POINT com
+    glPointSize), com teste de profundidade. Retorna os pixels cobertos.
+    """
+    half = point_size / 2.0
+    span = int(math.ceil(point_size)) + 1
+    offsets = np.arange(span) - span // 2
+
+    # Pixels candidatos ao redor de cada ponto; ficam os de centro no quadrado
+    px = np.floor(screen_x[points])[:, None, None].astype(np.int64) + offsets[None, None, :]
+    py = np.floor(screen_y[points])[:, None, None].astype(np.int64) + offsets[None, :, None]
+    px, py = np.broadcast_arrays(px, py)
+    dx = px + 0.5 - screen_x[points][:, None, None]
+    dy = py + 0.5 - screen_y[points][:, None, None]
+    inside = (dx >= -half) & (dx < half) & (dy >= -half) & (dy < half)
+    inside &= (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+    z = np.broadcast_to(depth[points][:, None, None], inside.shape)[inside]
+    pixel = (py * width + px)[inside]
+    return pixel[_nearest_fragments(pixel, z, zbuffer)]
+
+
+def _raster_lines(edges, screen_x, screen_y, depth, width, height, zbuffer):
+    """
+    Desenha as arestas com largura de 1 pixel (GL_LINE), amostrando um pixel
+    por coluna ou linha ao longo do eixo maior, com a profundidade
+    interpolada e teste de profundidade. Retorna os pixels cobertos.
+    """
+    start = np.c_[screen_x[edges[:, 0]], screen_y[edges[:, 0]]]
+    delta = np.c_[screen_x[edges[:, 1]], screen_y[edges[:, 1]]] - start
+    z0 = depth[edges[:, 0]]
+    dz = depth[edges[:, 1]] - z0
+
+    # Amostras nos centros de pixel do eixo maior
+    major = np.abs(delta).argmax(axis=1)
+    rows = np.arange(len(edges))
+    first = np.ceil(start[rows, major] - 0.5)
+    last = np.ceil(start[rows, major] + delta[rows, major] - 0.5)
+    low = np.minimum(first, last)
+    counts = np.abs(last - first).astype(np.int64)
+    owner = np.repeat(rows, counts)
+    centers = low[owner] + (np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)) + 0.5
+
+    length = delta[owner, major[owner]]
+    t = (centers - start[owner, major[owner]]) / np.where(length != 0, length, 1.0)
+    samples = start[owner] + delta[owner] * t[:, None]
+    samples[np.arange(len(owner)), major[owner]] = centers
+    px = np.floor(samples[:, 0]).astype(np.int64)
+    py = np.floor(samples[:, 1]).astype(np.int64)
+    z = z0[owner] + dz[owner] * t
+
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    pixel = (py * width + px)[inside]
+    return pixel[_nearest_fragments(pixel, z[inside], zbuffer)]
+
+
+def render_mesh(vertices, normals, indices, model, view, projection, width=800, height=600,
+                render_mode=0, light_pos=(3.0, 3.0, 5.0), view_pos=(0.0, 0.0, 5.0),
+                light_color=(1.0, 1.0, 1.0), object_color=(0.5, 0.7, 0.9), background=(0.1, 0.1, 0.1),
+                point_size=3.0, tile_size=64, chunk_size=4096):
+    """
+    Rasterizador de referência em NumPy para o par vertex_shader /
+    fragment_shader de n1Objeto3D: renderiza uma malha de triângulos (arrays
+    de create_sphere) em uma imagem (altura, largura, 3) uint8, sem GPU e de
+    forma determinística. As matrizes seguem a convenção de n1Objeto3D
+    (linha a linha, como enviadas com GL_TRUE).
+
+    Os vértices são transformados em lote, os triângulos são recortados pelo
+    plano próximo e rasterizados em blocos com z-buffer. Os modos seguem o
+    uniform renderMode:
+        0: preenchido, com iluminação de Phong por pixel (correção de perspectiva)
+        1: pontos (vértices de point_size pixels), na cor do objeto
+        2: wireframe (arestas de 1 pixel), na cor do objeto
+    """
+    positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    vertex_normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    model = np.asarray(model, dtype=np.float64)
+
+    # Transformação dos vértices (como no vertex_shader)
+    world = positions @ model[:3, :3].T + model[:3, 3]
+    world_normals = vertex_normals @ np.linalg.inv(model[:3, :3])
+    view_projection = np.asarray(projection, dtype=np.float64) @ np.asarray(view, dtype=np.float64)
+    clip = world @ view_projection[:, :3].T + view_projection[:, 3]
+
+    triangles, clip, world, world_normals = _clip_near(triangles, clip, world, world_normals)
+
+    # Coordenadas de janela (centros dos pixels em i + 0.5; linha 0 no topo)
+    w = clip[:, 3]
+    safe_w = np.where(w > 0, w, 1.0)
+    screen_x = (clip[:, 0] / safe_w + 1.0) * 0.5 * width
+    screen_y = (1.0 - clip[:, 1] / safe_w) * 0.5 * height
+    depth = (clip[:, 2] / safe_w) * 0.5 + 0.5
+
+    zbuffer = np.full(width * height, np.inf)
+    image = np.empty((height * width, 3))
+    image[:] = background
+
+    if render_mode == 1:
+        points = np.unique(triangles)
+        in_view = np.all(np.abs(clip[points, :3]) <= clip[points, 3:4], axis=1)
+        covered = _raster_points(points[in_view], screen_x, screen_y, depth, width, height, zbuffer, point_size)
+        image[covered] = object_color
+    elif render_mode == 2:
+        edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]), axis=1)
+        edges = np.unique(edges, axis=0)
+        covered = _raster_lines(edges, screen_x, screen_y, depth, width, height, zbuffer)
+        image[covered] = object_color
+    else:
+        winner, weights = _raster_triangles(triangles, screen_x, screen_y, depth, width, height,
+                                            zbuffer, tile_size, chunk_size)
+
+        # Iluminação só dos pixels visíveis, com interpolação correta em perspectiva
+        covered = np.flatnonzero(winner >= 0)
+        if len(covered):
+            corners = triangles[winner[covered]]
+            perspective = weights[covered] / safe_w[corners]
+            perspective /= perspective.sum(axis=1, keepdims=True)
+            frag_position = np.einsum('ij,ijk->ik', perspective, world[corners])
+            frag_normal = np.einsum('ij,ijk->ik', perspective, world_normals[corners])
+            image[covered] = _phong(frag_position, frag_normal, light_pos, view_pos, light_color, object_color)
+
+    return np.rint(np.clip(image, 0.0, 1.0) * 255.0).astype(np.uint8).reshape(height, width, 3)
@@ -1,27 +1,188 @@
+import argparse
+import sys
+
 import numpy as np
+from OpenGL import GL
 from OpenGL.GL import *
 from OpenGL.GLUT import *
 from OpenGL.GLU import *
 import math
 
+from n1Espacial import SegmentIndex, grow_buffer, look_at, ray_from_screen
+from n1Geometria import load_turtle, write_turtle
+from n1Instrumentacao import instruments
+from n1LindenMayer import iter_l_system, parse_rule
+from n1Objeto3D import perspective
+
+class SegmentRenderer:
+    """
+    Renderizador em modo retido para os segmentos da tartaruga: os dados
+    ficam em um vertex buffer (VBO) e são desenhados com um único
+    glDrawArrays. A cada sincronização apenas os segmentos novos (o final
+    do buffer) são enviados.
+    """
+    # Bytes por segmento (2 vértices de 3 floats)
+    segment_bytes = 2 * 3 * 4
+    
+    def __init__(self, gl=GL):
+        self.gl = gl
+        self.vbo = None
+        self.capacity = 0
+        self.count = 0
+        self.revision = None
+        self.bytes_uploaded = 0
+    
+    def sync(self, segments, revision=0):
+        """
+        Atualiza o VBO com os segmentos (N, 2, 3) float32. Se a revisão
+        mudou (desenho limpo ou substituído) ou o número de segmentos
+        diminuiu, tudo é reenviado; caso contrário, só o final novo.
+        """
+        gl = self.gl
+        count = len(segments)
+        if self.vbo is None:
+            self.vbo = gl.glGenBuffers(1)
+        
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        
+        if count > self.capacity:
+            # Realoca com folga (dobra) e reenvia tudo
+            self.capacity = max(count, 2 * self.capacity)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.capacity * self.segment_bytes, None, gl.GL_DYNAMIC_DRAW)
+            first = 0
+        elif revision != self.revision or count < self.count:
+            first = 0
+        else:
+            first = self.count
+        
+        if count > first:
+            tail = np.ascontiguousarray(segments[first:count], dtype=np.float32)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, first * self.segment_bytes, tail.nbytes, tail)
+            self.bytes_uploaded += tail.nbytes
+            instruments.count('bytes_uploaded', tail.nbytes)
+        
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.count = count
+        self.revision = revision
+        return self
+    
+    def draw(self):
+        """Desenha todos os segmentos sincronizados com um único glDrawArrays"""
+        if not self.count:
+            return
+        gl = self.gl
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, None)
+        gl.glDrawArrays(gl.GL_LINES, 0, 2 * self.count)
+        instruments.count('draw_calls')
+        instruments.count('segments_drawn', self.count)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+    
+    def delete(self):
+        """Libera o VBO"""
+        if self.vbo is not None:
+            self.gl.glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        self.capacity = 0
+        self.count = 0
+        self.revision = None
+
+
+def _orthonormalize(frame):
+    """
+    Refaz a base ortonormal (frente, cima, direita) por Gram-Schmidt: a
+    frente é normalizada, o vetor para cima perde a componente na frente e
+    a direita passa a ser frente x cima.
+    """
+    direction = frame[0] / np.linalg.norm(frame[0])
+    up_vector = frame[1] - np.dot(frame[1], direction) * direction
+    up_vector /= np.linalg.norm(up_vector)
+    return np.array([direction, up_vector, np.cross(direction, up_vector)])
+
+
+class _LineList:
+    """
+    Visão compatível com a antiga lista Turtle3D.lines sobre o buffer de
+    segmentos: cada item é uma cópia do par (início, fim), acessível como
+    line[0] e line[1], e append / extend acrescentam segmentos à tartaruga.
+    """
+    
+    __slots__ = ('turtle',)
+    
+    def __init__(self, turtle):
+        self.turtle = turtle
+    
+    def __len__(self):
+        return self.turtle._segment_count
+    
+    def __bool__(self):
+        return self.turtle._segment_count > 0
+    
+    def __getitem__(self, index):
+        return self.turtle.segments[index].copy()
+    
+    def __iter__(self):
+        return iter(self.turtle.segments.copy())
+    
+    def append(self, line):
+        start, end = line
+        self.turtle._add_segment(start, end)
+    
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+    
+    def clear(self):
+        self.turtle.clear()
+
+
 class Turtle3D:
+    # Capacidade inicial do buffer de segmentos
+    initial_capacity = 1024
+    
+    # Profundidade inicial da pilha de estados (cresce por dobra)
+    initial_stack_depth = 64
+    
+    # Número de rotações entre renormalizações dos vetores de orientação
+    renormalize_interval = 64
+    
+    # Matrizes de rotação já calculadas, indexadas por (eixo, ângulo)
+    _rotation_cache = {}
+    
     def __init__(self):
         # Inicializa a posição da tartaruga na origem
         self.position = np.array([0.0, 0.0, 0.0])
         
-        # Inicializa a orientação da tartaruga (frente, cima, direita)
-        self.direction = np.array([1.0, 0.0, 0.0])  # Inicialmente apontando para o eixo X positivo
-        self.up_vector = np.array([0.0, 1.0, 0.0])  # Inicialmente apontando para o eixo Y positivo
-        self.right_vector = np.array([0.0, 0.0, 1.0])  # Inicialmente apontando para o eixo Z positivo
+        # Inicializa a orientação da tartaruga como uma única matriz 3x3 cujas
+        # linhas são os vetores frente, cima e direita
+        self.frame = np.array([
+            [1.0, 0.0, 0.0],  # frente: inicialmente apontando para o eixo X positivo
+            [0.0, 1.0, 0.0],  # cima: inicialmente apontando para o eixo Y positivo
+            [0.0, 0.0, 1.0]   # direita: inicialmente apontando para o eixo Z positivo
+        ])
+        
+        # Rotações desde a última renormalização
+        self._rotation_count = 0
+        
+        # Pilha para armazenar estados anteriores (para transformações hierárquicas).
+        # Cada linha guarda um estado: posição (3), orientação (9) e caneta (1)
+        self._stack = np.empty((self.initial_stack_depth, 13))
+        self.stack_depth = 0
+        self.max_stack_depth = 0
         
-        # Inicializa a matriz de transformação como a identidade
-        self.transform_matrix = np.identity(4)
+        # Segmentos para desenhar, em um buffer float32 pré-alocado que
+        # dobra de tamanho quando enche (cada segmento é um par de pontos)
+        self._segments = np.empty((self.initial_capacity, 2, 3), dtype=np.float32)
+        self._segment_count = 0
         
-        # Pilha para armazenar estados anteriores (para transformações hierárquicas)
-        self.stack = []
+        # Revisão dos segmentos: muda sempre que o desenho é limpo ou
+        # substituído (e não apenas estendido)
+        self.revision = 0
         
-        # Lista de linhas para desenhar (cada linha é um par de pontos)
-        self.lines = []
+        # Renderizador com VBO (criado no primeiro draw, com contexto GL ativo)
+        self.renderer = None
         
         # Caneta (True para desenhar, False para não desenhar enquanto se move)
         self.pen_down = True
@@ -30,6 +191,52 @@ class Turtle3D:
         self.default_step = 0.1
         self.default_angle = 10.0  # em graus
         
+    @property
+    def segments(self):
+        """Segmentos desenhados como um array (N, 2, 3) float32, sem cópia"""
+        return self._segments[:self._segment_count]
+    
+    @property
+    def lines(self):
+        """
+        Compatibilidade com a antiga lista de linhas: cada item é um par
+        (início, fim), acessível como line[0] e line[1]. Para operações em
+        lote, use segments.
+        """
+        return _LineList(self)
+    
+    @lines.setter
+    def lines(self, lines):
+        # Copia antes de limpar: lines pode ser uma visão do próprio buffer
+        lines = np.array(list(lines), dtype=np.float32).reshape(-1, 2, 3)
+        self._segment_count = 0
+        self.revision += 1
+        self._reserve(len(lines))
+        self._segments[:len(lines)] = lines
+        self._segment_count = len(lines)
+    
+    def _reserve(self, count):
+        """Garante espaço para mais 'count' segmentos (crescimento por dobra)"""
+        self._segments = grow_buffer(self._segments, self._segment_count, self._segment_count + count)
+    
+    def adopt_segments(self, segments):
+        """
+        Usa o array (N, 2, 3) float32 dado como buffer de segmentos, sem
+        cópia (por exemplo, o np.memmap de n1Geometria.load_turtle). Se mais
+        segmentos forem desenhados, o buffer cresce e é copiado como sempre.
+        """
+        self._segments = segments
+        self._segment_count = len(segments)
+        self.revision += 1
+    
+    def _add_segment(self, start, end):
+        """Adiciona um segmento ao buffer"""
+        if self._segment_count == len(self._segments):
+            self._reserve(1)
+        self._segments[self._segment_count, 0] = start
+        self._segments[self._segment_count, 1] = end
+        self._segment_count += 1
+    
     def forward(self, distance):
         """Move a tartaruga para frente na direção atual"""
         old_position = self.position.copy()
@@ -39,7 +246,7 @@ class Turtle3D:
         
         # Se a caneta estiver abaixada, adiciona uma linha à lista
         if self.pen_down:
-            self.lines.append((old_position, self.position))
+            self._add_segment(old_position, self.position)
             
         return self
     
@@ -56,7 +263,7 @@ class Turtle3D:
         
         # Se a caneta estiver abaixada, adiciona uma linha à lista
         if self.pen_down:
-            self.lines.append((old_position, self.position))
+            self._add_segment(old_position, self.position)
             
         return self
     
@@ -73,7 +280,7 @@ class Turtle3D:
         
         # Se a caneta estiver abaixada, adiciona uma linha à lista
         if self.pen_down:
-            self.lines.append((old_position, self.position))
+            self._add_segment(old_position, self.position)
             
         return self
     
@@ -81,68 +288,128 @@ class Turtle3D:
         """Move a tartaruga para a esquerda"""
         return self.move_right(-distance)
     
-    def rotate_x(self, angle_deg):
-        """Rotaciona a tartaruga em torno do eixo X"""
-        angle_rad = math.radians(angle_deg)
-        rotation_matrix = np.array([
-            [1, 0, 0],
-            [0, math.cos(angle_rad), -math.sin(angle_rad)],
-            [0, math.sin(angle_rad), math.cos(angle_rad)]
-        ])
+    @property
+    def direction(self):
+        """Vetor frente (linha 0 da matriz de orientação)"""
+        return self.frame[0]
+    
+    @direction.setter
+    def direction(self, value):
+        self._set_frame_row(0, value)
+    
+    @property
+    def up_vector(self):
+        """Vetor cima (linha 1 da matriz de orientação)"""
+        return self.frame[1]
+    
+    @up_vector.setter
+    def up_vector(self, value):
+        self._set_frame_row(1, value)
+    
+    @property
+    def right_vector(self):
+        """Vetor direita (linha 2 da matriz de orientação)"""
+        return self.frame[2]
+    
+    @right_vector.setter
+    def right_vector(self, value):
+        self._set_frame_row(2, value)
+    
+    def _set_frame_row(self, row, value):
+        # Nova matriz, para que vetores obtidos antes não mudem de valor
+        frame = self.frame.copy()
+        frame[row] = value
+        self.frame = frame
+    
+    @classmethod
+    def _rotation(cls, axis, angle_deg):
+        """
+        Retorna a transposta da matriz de rotação em torno do eixo indicado
+        ('x', 'y' ou 'z'), calculada uma única vez por (eixo, ângulo).
+        """
+        key = (axis, angle_deg)
+        rotation = cls._rotation_cache.get(key)
+        if rotation is None:
+            angle_rad = math.radians(angle_deg)
+            c = math.cos(angle_rad)
+            s = math.sin(angle_rad)
+            if axis == 'x':
+                rotation = np.array([[1, 0, 0], [0, c, -s], [0, s, c]], dtype=np.float64)
+            elif axis == 'y':
+                rotation = np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]], dtype=np.float64)
+            else:
+                rotation = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=np.float64)
+            # Os vetores são linhas da matriz de orientação: v' = R v  =>  F' = F R^T
+            rotation = np.ascontiguousarray(rotation.T)
+            if len(cls._rotation_cache) >= 4096:
+                cls._rotation_cache.clear()
+            cls._rotation_cache[key] = rotation
+        return rotation
+    
+    @classmethod
+    def _local_rotation(cls, axis, angle_deg):
+        """
+        Retorna a matriz que gira a orientação em torno de um eixo da própria
+        tartaruga: 'turn' (em torno de cima; positivo vira à esquerda),
+        'pitch' (em torno da direita; positivo levanta a frente) ou 'roll'
+        (em torno da frente; positivo inclina para a direita). Como atua
+        sobre as linhas da matriz de orientação, aplica-se como F' = M F.
+        """
+        key = (axis, angle_deg)
+        rotation = cls._rotation_cache.get(key)
+        if rotation is None:
+            angle_rad = math.radians(angle_deg)
+            c = math.cos(angle_rad)
+            s = math.sin(angle_rad)
+            if axis == 'turn':
+                rotation = np.array([[c, 0, -s], [0, 1, 0], [s, 0, c]], dtype=np.float64)
+            elif axis == 'pitch':
+                rotation = np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]], dtype=np.float64)
+            else:
+                rotation = np.array([[1, 0, 0], [0, c, s], [0, -s, c]], dtype=np.float64)
+            if len(cls._rotation_cache) >= 4096:
+                cls._rotation_cache.clear()
+            cls._rotation_cache[key] = rotation
+        return rotation
+    
+    def _rotate(self, axis, angle_deg):
+        """Aplica a rotação aos três vetores de orientação de uma só vez"""
+        if axis in ('x', 'y', 'z'):
+            self.frame = self.frame @ self._rotation(axis, angle_deg)
+        else:
+            self.frame = self._local_rotation(axis, angle_deg) @ self.frame
         
-        # Rotaciona os vetores de direção
-        self.direction = np.dot(rotation_matrix, self.direction)
-        self.up_vector = np.dot(rotation_matrix, self.up_vector)
-        self.right_vector = np.dot(rotation_matrix, self.right_vector)
-        
-        # Normaliza os vetores para evitar erros de arredondamento
-        self.direction = self.direction / np.linalg.norm(self.direction)
-        self.up_vector = self.up_vector / np.linalg.norm(self.up_vector)
-        self.right_vector = self.right_vector / np.linalg.norm(self.right_vector)
+        # Reortonormaliza os vetores periodicamente para evitar erros de arredondamento
+        self._rotation_count += 1
+        if self._rotation_count >= self.renormalize_interval:
+            self._rotation_count = 0
+            self.frame = _orthonormalize(self.frame)
         
         return self
     
+    def rotate_x(self, angle_deg):
+        """Rotaciona a tartaruga em torno do eixo X"""
+        return self._rotate('x', angle_deg)
+    
     def rotate_y(self, angle_deg):
         """Rotaciona a tartaruga em torno do eixo Y"""
-        angle_rad = math.radians(angle_deg)
-        rotation_matrix = np.array([
-            [math.cos(angle_rad), 0, math.sin(angle_rad)],
-            [0, 1, 0],
-            [-math.sin(angle_rad), 0, math.cos(angle_rad)]
-        ])
-        
-        # Rotaciona os vetores de direção
-        self.direction = np.dot(rotation_matrix, self.direction)
-        self.up_vector = np.dot(rotation_matrix, self.up_vector)
-        self.right_vector = np.dot(rotation_matrix, self.right_vector)
-        
-        # Normaliza os vetores para evitar erros de arredondamento
-        self.direction = self.direction / np.linalg.norm(self.direction)
-        self.up_vector = self.up_vector / np.linalg.norm(self.up_vector)
-        self.right_vector = self.right_vector / np.linalg.norm(self.right_vector)
-        
-        return self
+        return self._rotate('y', angle_deg)
     
     def rotate_z(self, angle_deg):
         """Rotaciona a tartaruga em torno do eixo Z"""
-        angle_rad = math.radians(angle_deg)
-        rotation_matrix = np.array([
-            [math.cos(angle_rad), -math.sin(angle_rad), 0],
-            [math.sin(angle_rad), math.cos(angle_rad), 0],
-            [0, 0, 1]
-        ])
-        
-        # Rotaciona os vetores de direção
-        self.direction = np.dot(rotation_matrix, self.direction)
-        self.up_vector = np.dot(rotation_matrix, self.up_vector)
-        self.right_vector = np.dot(rotation_matrix, self.right_vector)
-        
-        # Normaliza os vetores para evitar erros de arredondamento
-        self.direction = self.direction / np.linalg.norm(self.direction)
-        self.up_vector = self.up_vector / np.linalg.norm(self.up_vector)
-        self.right_vector = self.right_vector / np.linalg.norm(self.right_vector)
-        
-        return self
+        return self._rotate('z', angle_deg)
+    
+    def turn(self, angle_deg):
+        """Gira em torno do próprio vetor cima (positivo: à esquerda)"""
+        return self._rotate('turn', angle_deg)
+    
+    def pitch(self, angle_deg):
+        """Gira em torno do próprio vetor direita (positivo: frente para cima)"""
+        return self._rotate('pitch', angle_deg)
+    
+    def roll(self, angle_deg):
+        """Gira em torno do próprio vetor frente (positivo: inclina para a direita)"""
+        return self._rotate('roll', angle_deg)
     
     def set_pen_up(self):
         """Levanta a caneta (parar de desenhar)"""
@@ -156,47 +423,54 @@ class Turtle3D:
     
     def save_state(self):
         """Salva o estado atual da tartaruga na pilha"""
-        state = {
-            'position': self.position.copy(),
-            'direction': self.direction.copy(),
-            'up_vector': self.up_vector.copy(),
-            'right_vector': self.right_vector.copy(),
-            'transform_matrix': self.transform_matrix.copy(),
-            'pen_down': self.pen_down
-        }
-        self.stack.append(state)
+        if self.stack_depth == len(self._stack):
+            grown = np.empty((2 * len(self._stack), 13))
+            grown[:self.stack_depth] = self._stack
+            self._stack = grown
+        
+        state = self._stack[self.stack_depth]
+        state[0:3] = self.position
+        state[3:12] = self.frame.ravel()
+        state[12] = self.pen_down
+        
+        self.stack_depth += 1
+        if self.stack_depth > self.max_stack_depth:
+            self.max_stack_depth = self.stack_depth
         return self
     
     def restore_state(self):
         """Restaura o último estado salvo da tartaruga"""
-        if self.stack:
-            state = self.stack.pop()
-            self.position = state['position']
-            self.direction = state['direction']
-            self.up_vector = state['up_vector']
-            self.right_vector = state['right_vector']
-            self.transform_matrix = state['transform_matrix']
-            self.pen_down = state['pen_down']
+        if self.stack_depth:
+            self.stack_depth -= 1
+            state = self._stack[self.stack_depth]
+            self.position = state[0:3].copy()
+            self.frame = state[3:12].reshape(3, 3).copy()
+            self.pen_down = bool(state[12])
         return self
     
     def clear(self):
         """Limpa todas as linhas desenhadas"""
-        self.lines = []
+        self._segment_count = 0
+        self.revision += 1
         return self
     
     def reset(self):
         """Reseta a tartaruga para o estado inicial"""
+        # O renderizador (e seu VBO) é mantido; a nova revisão força o reenvio
+        renderer = self.renderer
+        revision = self.revision
         self.__init__()
+        self.renderer = renderer
+        self.revision = revision + 1
         return self
     
     def draw(self):
         """Desenha todas as linhas criadas pela tartaruga"""
-        # Desenhar as linhas
-        glBegin(GL_LINES)
-        for line in self.lines:
-            glVertex3fv(line[0])
-            glVertex3fv(line[1])
-        glEnd()
+        # Desenhar as linhas (apenas os segmentos novos são enviados ao VBO)
+        if self.renderer is None:
+            self.renderer = SegmentRenderer()
+        self.renderer.sync(self.segments, self.revision)
+        self.renderer.draw()
         
         # Desenhar a tartaruga como um pequeno triângulo na posição atual
         # Esta é uma representação simples da tartaruga
@@ -225,6 +499,13 @@ camera_distance = 5.0
 camera_rotation_x = 30.0
 camera_rotation_y = 45.0
 help_display = True  # Mostrar ajuda de comandos
+segment_index = SegmentIndex()  # Índice espacial das linhas (seleção e tecla K; sincronizado só quando usado)
+selected_segments = []  # Segmentos destacados (clique ou tecla K)
+
+# Projeção configurada em reshape (também usada na seleção com o mouse)
+field_of_view = 45.0
+near_plane = 0.1
+far_plane = 100.0
 
 # Função de inicialização do OpenGL
 def init():
@@ -234,15 +515,38 @@ def init():
 
 # Função de display
 def display():
-    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-    glLoadIdentity()
+    with instruments.timer('display'):
+        render_scene()
     
-    # Configurar a câmera para orbitar ao redor da origem
+    glutSwapBuffers()
+    
+    # Percentis do tempo de display no título da janela (a cada 60 quadros)
+    instruments.end_frame()
+    if instruments.enabled and instruments.frames % 60 == 0:
+        glutSetWindowTitle(f"Turtle 3D Interativa | {instruments.format_line('display')}".encode('utf-8'))
+
+
+# Posição da câmera, que orbita ao redor da origem
+def camera_position():
     x = camera_distance * math.sin(math.radians(camera_rotation_y)) * math.cos(math.radians(camera_rotation_x))
     y = camera_distance * math.sin(math.radians(camera_rotation_x))
     z = camera_distance * math.cos(math.radians(camera_rotation_y)) * math.cos(math.radians(camera_rotation_x))
+    return x, y, z
+
+
+# Matriz view-projection da câmera atual, calculada sem consultar o GL
+def camera_view_projection(width, height):
+    projection = perspective(field_of_view, width / height if height > 0 else 1, near_plane, far_plane)
+    return projection.astype(np.float64) @ look_at(camera_position(), (0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+
+
+# Desenho da cena: eixos, linhas da tartaruga e ajuda
+def render_scene():
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    glLoadIdentity()
     
-    gluLookAt(x, y, z,  # posição da câmera
+    # Configurar a câmera para orbitar ao redor da origem
+    gluLookAt(*camera_position(),  # posição da câmera
               0.0, 0.0, 0.0,  # ponto para onde a câmera está olhando
               0.0, 1.0, 0.0)  # vetor "up" da câmera
     
@@ -266,11 +570,21 @@ def display():
     glColor3f(1.0, 1.0, 1.0)
     turtle.draw()
     
+    # Destacar os segmentos selecionados
+    if selected_segments:
+        glLineWidth(3.0)
+        glColor3f(1.0, 1.0, 0.0)
+        glBegin(GL_LINES)
+        for index in selected_segments:
+            if index < len(turtle.segments):
+                glVertex3fv(turtle.segments[index, 0])
+                glVertex3fv(turtle.segments[index, 1])
+        glEnd()
+        glLineWidth(1.0)
+    
     # Desenhar o texto de ajuda
     if help_display:
         draw_help_text()
-    
-    glutSwapBuffers()
 
 
 # Função para desenhar texto na tela
@@ -311,6 +625,8 @@ def draw_help_text():
     draw_line("O: Restaurar último estado da pilha")
     draw_line("C: Limpar desenho")
     draw_line("X: Resetar tartaruga")
+    draw_line("K: Destacar os 5 segmentos mais próximos")
+    draw_line("Clique: Selecionar segmento")
     draw_line("Z: Alternar ajuda")
     
     # Comandos da câmera
@@ -330,7 +646,7 @@ def reshape(width, height):
     glViewport(0, 0, width, height)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
-    gluPerspective(45.0, width / height if height > 0 else 1, 0.1, 100.0)
+    gluPerspective(field_of_view, width / height if height > 0 else 1, near_plane, far_plane)
     glMatrixMode(GL_MODELVIEW)
 
 
@@ -373,10 +689,40 @@ def keyboard(key, x, y):
         turtle.restore_state()
     elif key == 'c':
         turtle.clear()
+        selected_segments.clear()
     elif key == 'x':
         turtle.reset()
+        selected_segments.clear()
     elif key == 'z':
         help_display = not help_display
+    elif key == 'k':
+        # Segmentos mais próximos da posição da tartaruga
+        segment_index.sync(turtle.segments, turtle.revision)
+        ids, distances = segment_index.nearest(turtle.position, 5)
+        selected_segments[:] = ids.tolist()
+        for index, distance in zip(ids.tolist(), distances.tolist()):
+            print(f"Segmento {index}: distância {distance:.3f}")
+    
+    glutPostRedisplay()
+
+
+# Seleção de segmentos com o mouse
+def mouse(button, state, x, y):
+    if button != GLUT_LEFT_BUTTON or state != GLUT_DOWN:
+        return
+    
+    # Raio pelo pixel clicado, com tolerância proporcional à distância da câmera
+    width, height = glutGet(GLUT_WINDOW_WIDTH), glutGet(GLUT_WINDOW_HEIGHT)
+    segment_index.sync(turtle.segments, turtle.revision)
+    origin, direction = ray_from_screen(x, y, camera_view_projection(width, height), width, height)
+    hit = segment_index.raycast(origin, direction, 0.01 * camera_distance)
+    if hit is None:
+        selected_segments.clear()
+        print("Nenhum segmento selecionado")
+    else:
+        selected_segments[:] = [hit[0]]
+        start, end = turtle.segments[hit[0]]
+        print(f"Segmento {hit[0]}: {np.round(start, 3)} -> {np.round(end, 3)}")
     
     glutPostRedisplay()
 
@@ -441,13 +787,206 @@ def draw_tree(turtle, length, depth):
     turtle.restore_state()
 
 
+# Versão vetorizada de draw_tree: processa todos os ramos de um nível de uma vez
+def draw_tree_vectorized(turtle, length, depth):
+    """
+    Produz os mesmos segmentos de draw_tree (na mesma ordem), avançando
+    todos os ramos de um mesmo nível juntos: a fronteira é guardada como
+    arrays de orientações (K, 3, 3) e posições (K, 3), com O(depth)
+    operações NumPy no total. A tartaruga termina no mesmo estado que
+    draw_tree deixaria.
+    """
+    if depth <= 0:
+        return turtle
+    
+    # Rotações relativas de cada um dos quatro ramos (F' = F R^T em sequência)
+    rotation = turtle._rotation
+    branches = np.array([
+        rotation('x', 45) @ rotation('z', 45),
+        rotation('x', 45) @ rotation('z', -45),
+        rotation('y', 45) @ rotation('x', 45),
+        rotation('y', 45) @ rotation('x', -45),
+    ])
+    
+    # Número de nós de uma subárvore com h níveis
+    def subtree_size(h):
+        return (4 ** h - 1) // 3
+    
+    total = subtree_size(depth)
+    draw = turtle.pen_down
+    if draw:
+        turtle._reserve(total)
+        output = turtle._segments[turtle._segment_count:turtle._segment_count + total]
+    
+    positions = turtle.position[None, :].astype(np.float64)
+    frames = turtle.frame[None, :, :]
+    # Índice de cada nó na ordem em que draw_tree o desenharia (pré-ordem)
+    order = np.zeros(1, dtype=np.int64)
+    root_end = None
+    
+    for level in range(depth):
+        ends = positions + frames[:, 0, :] * length
+        if root_end is None:
+            root_end = ends[0].copy()
+        if draw:
+            output[order, 0] = positions
+            output[order, 1] = ends
+        
+        if level == depth - 1:
+            break
+        
+        # Os quatro filhos de cada nó partem do fim do seu segmento
+        frames = (frames[:, None] @ branches[None]).reshape(-1, 3, 3)
+        positions = np.repeat(ends, 4, axis=0)
+        offsets = 1 + np.arange(4) * subtree_size(depth - level - 1)
+        order = (order[:, None] + offsets[None, :]).reshape(-1)
+        length *= 0.7
+    
+    if draw:
+        turtle._segment_count += total
+    turtle.position = root_end
+    return turtle
+
+
+# Interpreta um L-System (F, +, -, [, ]) com a tartaruga 3D no plano XY
+def draw_l_system(turtle, l_system, angle, distance):
+    """
+    Desenha um L-System com a tartaruga 3D, com a mesma semântica de
+    n1LindenMayer.draw_l_system. Aceita uma string ou qualquer iterável
+    de símbolos ou blocos de símbolos (por exemplo, o gerador de
+    n1LindenMayer.iter_l_system, inclusive com leaf_depth > 0).
+    """
+    for chunk in l_system:
+        for symbol in chunk:
+            if symbol == 'F':
+                turtle.forward(distance)
+            elif symbol == '+':
+                # Girar à direita (sentido horário visto de +Z)
+                turtle.rotate_z(-angle)
+            elif symbol == '-':
+                # Girar à esquerda
+                turtle.rotate_z(angle)
+            elif symbol == '[':
+                turtle.save_state()
+            elif symbol == ']':
+                turtle.restore_state()
+    
+    return turtle
+
+
+# Interpreta um L-System 3D (F, f, +, -, &, ^, \, /, |, [, ]) em uma única passada
+def draw_l_system_3d(turtle, l_system, angle, distance):
+    """
+    Desenha um L-System 3D com a tartaruga, usando o alfabeto padrão com
+    colchetes e rotações em torno dos eixos da própria tartaruga:
+    
+        F  avança desenhando        f  avança sem desenhar
+        +  vira à esquerda          -  vira à direita
+        &  inclina para baixo       ^  inclina para cima
+        \\  rola à esquerda          /  rola à direita
+        |  dá meia-volta            [ ]  salva / restaura o estado
+    
+    Os símbolos são processados em uma única passada com variáveis locais
+    e matrizes de rotação pré-calculadas; os segmentos são escritos
+    diretamente no buffer da tartaruga. Aceita uma string ou qualquer
+    iterável de símbolos ou blocos de símbolos (como os produzidos por
+    iter_l_system com leaf_depth > 0). A tartaruga termina no estado
+    final do desenho.
+    """
+    rotations = {
+        '+': turtle._local_rotation('turn', angle),
+        '-': turtle._local_rotation('turn', -angle),
+        '&': turtle._local_rotation('pitch', -angle),
+        '^': turtle._local_rotation('pitch', angle),
+        '\\': turtle._local_rotation('roll', -angle),
+        '/': turtle._local_rotation('roll', angle),
+        '|': turtle._local_rotation('turn', 180.0),
+    }
+    if isinstance(l_system, str):
+        turtle._reserve(l_system.count('F'))
+    
+    position = turtle.position.copy()
+    frame = turtle.frame
+    pen_down = turtle.pen_down
+    stack = []
+    rotation_count = turtle._rotation_count
+    renormalize_interval = turtle.renormalize_interval
+    
+    for chunk in l_system:
+        for symbol in chunk:
+            if symbol == 'F' or symbol == 'f':
+                end = position + frame[0] * distance
+                if symbol == 'F' and pen_down:
+                    count = turtle._segment_count
+                    if count == len(turtle._segments):
+                        turtle._reserve(1)
+                    segment = turtle._segments[count]
+                    segment[0] = position
+                    segment[1] = end
+                    turtle._segment_count = count + 1
+                position = end
+            elif symbol in rotations:
+                frame = rotations[symbol] @ frame
+                rotation_count += 1
+                if rotation_count >= renormalize_interval:
+                    rotation_count = 0
+                    frame = _orthonormalize(frame)
+            elif symbol == '[':
+                stack.append((position, frame, pen_down))
+            elif symbol == ']':
+                if stack:
+                    position, frame, pen_down = stack.pop()
+    
+    turtle.position = position
+    turtle.frame = frame
+    turtle.pen_down = pen_down
+    turtle._rotation_count = rotation_count
+    return turtle
+
+
 # Função principal
-def main():
+def parse_args(argv=None):
+    """Lê da linha de comando um L-System 3D opcional para desenhar ao iniciar"""
+    parser = argparse.ArgumentParser(description="Tartaruga 3D interativa.")
+    parser.add_argument('--axiom', help="Axioma de um L-System 3D a desenhar ao iniciar")
+    parser.add_argument('--rule', dest='rules', action='append', type=parse_rule, default=[],
+                        help="Regra de produção no formato X=sucessor (pode ser repetida)")
+    parser.add_argument('--iterations', type=int, default=3, help="Número de iterações")
+    parser.add_argument('--angle', type=float, default=22.5, help="Ângulo de rotação (em graus)")
+    parser.add_argument('--distance', type=float, default=0.1, help="Distância de cada passo")
+    parser.add_argument('--save', help="Salva as linhas do L-System em um arquivo .n1g")
+    parser.add_argument('--load', help="Abre as linhas de um arquivo .n1g (sem regenerar)")
+    parser.add_argument('--stats', action='store_true',
+                        help="Mede o tempo de display (percentis no título da janela)")
+    parser.add_argument('--stats-jsonl', help="Também exporta as medidas de cada quadro neste arquivo JSON lines")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     global turtle
     
+    args = parse_args(argv)
+    if args.stats or args.stats_jsonl:
+        instruments.enable(args.stats_jsonl)
+    
     # Inicializa a tartaruga
     turtle = Turtle3D()
     
+    # Desenha o L-System pedido, com a tartaruga apontando para cima (eixo Y)
+    if args.axiom:
+        turtle.rotate_z(90)
+        draw_l_system_3d(turtle, iter_l_system(args.axiom, dict(args.rules), args.iterations),
+                         args.angle, args.distance)
+        print(f"L-System 3D: {len(turtle.segments)} segmentos")
+        if args.save:
+            write_turtle(args.save, turtle, {'axiom': args.axiom, 'rules': dict(args.rules),
+                                             'iterations': args.iterations, 'angle': args.angle,
+                                             'distance': args.distance})
+            print(f"Linhas salvas em {args.save}")
+    elif args.load:
+        load_turtle(args.load, turtle)
+        print(f"{len(turtle.segments)} segmentos abertos de {args.load}")
+    
     # Inicializa o OpenGL
     glutInit(sys.argv)
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
@@ -461,6 +1000,7 @@ def main():
     glutReshapeFunc(reshape)
     glutKeyboardFunc(keyboard)
     glutSpecialFunc(special_keyboard)
+    glutMouseFunc(mouse)
     
     # Inicia o loop principal
     print("=== Controlando a Tartaruga 3D ===")
@@ -470,11 +1010,11 @@ def main():
     print("Use P para salvar o estado e O para restaurar.")
     print("Use C para limpar o desenho e X para resetar a tartaruga.")
     print("Use Z para alternar a exibição da ajuda.")
+    print("Clique em um segmento para selecioná-lo e use K para destacar os mais próximos da tartaruga.")
     print("Use as setas para rotacionar a câmera e Page Up/Down para aproximar/afastar.")
     
     glutMainLoop()
 
 
 if __name__ == "__main__":
-    import sys
     main()
\ No newline at end of file
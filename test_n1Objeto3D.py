@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from n1Objeto3D import ProgramCache
+
+
+class FakeGL:
+    """Driver de OpenGL simulado com suporte a binários de programa"""
+    (GL_VENDOR, GL_RENDERER, GL_VERSION, GL_NUM_PROGRAM_BINARY_FORMATS,
+     GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, GL_COMPILE_STATUS, GL_LINK_STATUS,
+     GL_PROGRAM_BINARY_LENGTH, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE) = range(11)
+
+    binary_format = 7
+
+    def __init__(self, version=b"4.6 fake"):
+        self.version = version
+        self.programs = {}
+        self.links = 0
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+    def glGetString(self, name):
+        return self.version if name == self.GL_VERSION else b"fake"
+
+    def glGetIntegerv(self, name):
+        return 1
+
+    def glCreateShader(self, shader_type):
+        return 1
+
+    def glGetShaderiv(self, shader, name):
+        return True
+
+    def glCreateProgram(self):
+        program = len(self.programs) + 1
+        self.programs[program] = False
+        return program
+
+    def glLinkProgram(self, program):
+        self.links += 1
+        self.programs[program] = True
+
+    def _binary(self):
+        return np.frombuffer(b"binary " + self.version, dtype=np.uint8)
+
+    def glProgramBinary(self, program, binary_format, binary, length):
+        # Só aceita o binário do próprio driver (e da mesma versão)
+        self.programs[program] = (binary_format == self.binary_format and
+                                  bytes(binary) == self._binary().tobytes())
+
+    def glGetProgramiv(self, program, name):
+        if name == self.GL_PROGRAM_BINARY_LENGTH:
+            return len(self._binary())
+        return self.programs[program]
+
+    def glGetProgramBinary(self, program, length, written, binary_format, binary):
+        data = self._binary()
+        binary[:len(data)] = data
+        written[0] = len(data)
+        binary_format[0] = self.binary_format
+
+
+class ProgramCacheTest(unittest.TestCase):
+    vertex = "void main() {}"
+    fragment = "void main() { }"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def cache(self, gl):
+        return ProgramCache(self.directory.name, gl)
+
+    def test_miss_stores_binary_and_hit_skips_linking(self):
+        gl = FakeGL()
+        cache = self.cache(gl)
+        self.assertTrue(cache.create_program(self.vertex, self.fragment))
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'invalid': 0})
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+        self.assertTrue(cache.create_program(self.vertex, self.fragment))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'invalid': 0})
+        self.assertEqual(gl.links, 1)
+
+    def test_different_shaders_use_different_entries(self):
+        cache = self.cache(FakeGL())
+        cache.create_program(self.vertex, self.fragment)
+        cache.create_program(self.vertex, "void main() { discard; }")
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_rejected_binary_is_recompiled_and_rewritten(self):
+        gl = FakeGL()
+        cache = self.cache(gl)
+        cache.create_program(self.vertex, self.fragment)
+        path = cache.path(cache.key(self.vertex, self.fragment))
+        with open(path, 'r+b') as file:
+            file.seek(6)
+            file.write(b"??")
+
+        cache = self.cache(gl)
+        self.assertTrue(cache.create_program(self.vertex, self.fragment))
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'invalid': 1})
+        self.assertEqual(gl.links, 2)
+
+        # O arquivo regravado volta a ser aceito
+        cache = self.cache(gl)
+        cache.create_program(self.vertex, self.fragment)
+        self.assertEqual(cache.hits, 1)
+
+    def test_truncated_file_is_invalid(self):
+        cache = self.cache(FakeGL())
+        path = cache.path(cache.key(self.vertex, self.fragment))
+        with open(path, 'wb') as file:
+            file.write(b"\x07")
+        cache.create_program(self.vertex, self.fragment)
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'invalid': 1})
+
+    def test_driver_change_uses_another_key(self):
+        self.cache(FakeGL()).create_program(self.vertex, self.fragment)
+        cache = self.cache(FakeGL(version=b"4.6 fake updated"))
+        cache.create_program(self.vertex, self.fragment)
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'invalid': 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
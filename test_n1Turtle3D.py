@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from n1Turtle3D import SegmentRenderer, Turtle3D
+
+
+class FakeGL:
+    """Camada de OpenGL que só registra as chamadas de buffer"""
+    GL_ARRAY_BUFFER = GL_DYNAMIC_DRAW = GL_VERTEX_ARRAY = GL_FLOAT = GL_LINES = 0
+
+    def __init__(self):
+        self.allocations = []
+        self.uploads = []
+        self.draws = []
+
+    def glGenBuffers(self, count):
+        return 1
+
+    def glBufferData(self, target, size, data, usage):
+        self.allocations.append(size)
+
+    def glBufferSubData(self, target, offset, size, data):
+        self.uploads.append((offset, size, np.array(data)))
+
+    def glDrawArrays(self, mode, first, count):
+        self.draws.append(count)
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+def draw_steps(turtle, count):
+    for _ in range(count):
+        turtle.forward(1.0)
+        turtle.rotate_z(10.0)
+
+
+class SegmentRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.gl = FakeGL()
+        self.renderer = SegmentRenderer(self.gl)
+        self.turtle = Turtle3D()
+
+    def sync(self):
+        self.renderer.sync(self.turtle.segments, self.turtle.revision)
+
+    def test_only_the_new_tail_is_uploaded(self):
+        # 3 segmentos e depois 1 a mais: a capacidade dobra para 6
+        draw_steps(self.turtle, 3)
+        self.sync()
+        draw_steps(self.turtle, 1)
+        self.sync()
+        draw_steps(self.turtle, 2)
+        self.sync()
+
+        segment_bytes = SegmentRenderer.segment_bytes
+        self.assertEqual(self.gl.uploads[-1][:2], (4 * segment_bytes, 2 * segment_bytes))
+        np.testing.assert_array_equal(self.gl.uploads[-1][2], self.turtle.segments[4:])
+        self.assertEqual(self.renderer.bytes_uploaded, (3 + 4 + 2) * segment_bytes)
+
+    def test_unchanged_segments_are_not_uploaded_again(self):
+        draw_steps(self.turtle, 3)
+        self.sync()
+        self.sync()
+        self.assertEqual(len(self.gl.uploads), 1)
+
+    def test_clear_uploads_everything_again(self):
+        draw_steps(self.turtle, 3)
+        self.sync()
+        self.turtle.clear()
+        draw_steps(self.turtle, 4)
+        self.sync()
+        self.assertEqual(self.gl.uploads[-1][:2], (0, 4 * SegmentRenderer.segment_bytes))
+
+    def test_capacity_grows_by_doubling(self):
+        draw_steps(self.turtle, 3)
+        self.sync()
+        draw_steps(self.turtle, 1)
+        self.sync()
+        self.assertEqual(self.gl.allocations, [3 * SegmentRenderer.segment_bytes, 6 * SegmentRenderer.segment_bytes])
+        # Depois de realocar, o buffer inteiro é reenviado
+        self.assertEqual(self.gl.uploads[-1][:2], (0, 4 * SegmentRenderer.segment_bytes))
+
+    def test_draw_is_a_single_call(self):
+        draw_steps(self.turtle, 5)
+        self.sync()
+        self.renderer.draw()
+        self.assertEqual(self.gl.draws, [10])
+
+
+if __name__ == "__main__":
+    unittest.main()